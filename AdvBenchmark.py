@@ -0,0 +1,196 @@
+# File: AdvBenchmark.py
+
+"""
+This module times the hot paths of the game: loading a world, reading
+objects and synonyms, parsing a command, choosing a passage and playing
+commands end to end.  Results are printed as JSON with percentiles and
+can be saved as a baseline and compared against on later runs, which
+exits with status 1 if any median got slower than the tolerance allows.
+Synthetic worlds of any size can be generated on the fly with AdvGenerate.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+from AdvGame import AdvGame
+from AdvOutput import NullSink
+from AdvGenerate import generateWorld
+
+# Constants
+DEFAULT_PREFIXES = ["Crowther", "Small"]
+DEFAULT_BASELINE = "bench_baseline.json"
+DEFAULT_TOLERANCE = 0.25
+BUILTIN_COMMANDS = ["LOOK", "INVENTORY", "TAKE", "DROP"]
+
+def percentile(values, fraction):    #returns the nearest-rank percentile of a sorted list
+    index = max(0, min(len(values) - 1, int(round(fraction * len(values))) - 1))
+    return values[index]
+
+def summarize(samples, unit="ns"):     #returns the statistics reported for a list of timings
+    values = sorted(samples)
+    return {
+        "unit": unit,
+        "samples": len(values),
+        "min": values[0],
+        "p50": percentile(values, 0.50),
+        "p90": percentile(values, 0.90),
+        "p99": percentile(values, 0.99),
+        "mean": sum(values) / len(values),
+    }
+
+def timeBatches(function, args_list, batch):     #times function over args_list in batches and returns ns per call
+    samples = []
+    clock = time.perf_counter_ns
+    for start in range(0, len(args_list) - batch + 1, batch):
+        chunk = args_list[start:start + batch]
+        t0 = clock()
+        for args in chunk:
+            function(*args)
+        samples.append((clock() - t0) / batch)
+    return samples
+
+def walkCommands(game, count, seed=0):    #returns a plausible script of commands found by wandering the world
+    rand = random.Random(seed)
+    session = game.newSession(NullSink())
+    room = game.startSession(session)
+    commands = []
+    while len(commands) < count:
+        if room is None:
+            session = game.newSession(NullSink())
+            room = game.startSession(session)
+        verbs = [verb for verb, _, _ in room.getPassages() if verb != "FORCED"]
+        contents = session.getContents(room.getName())
+        choice = rand.random()
+        if verbs and choice < 0.7:
+            line = rand.choice(verbs)
+        elif contents and choice < 0.8:
+            line = "TAKE " + rand.choice(contents)
+        elif len(session.getInventory()) > 0 and choice < 0.9:
+            line = "DROP " + rand.choice(list(session.getInventory()))
+        else:
+            line = rand.choice(BUILTIN_COMMANDS)
+        commands.append(line)
+        command, item = game.parseInput(line)
+        room = game.processCommand(command, item, session)
+    return commands
+
+def playCommands(game, commands):     #plays a script with no output, starting over whenever the game ends
+    session = game.newSession(NullSink())
+    room = game.startSession(session)
+    for line in commands:
+        if room is None:
+            session = game.newSession(NullSink())
+            room = game.startSession(session)
+        command, item = game.parseInput(line)
+        room = game.processCommand(command, item, session)
+
+def benchmarkWorld(prefix, repeat=20, commands=20000, seed=0):    #returns the timings for one world
+    results = {}
+    clock = time.perf_counter_ns
+
+    samples = []
+    for _ in range(repeat):
+        t0 = clock()
+        game = AdvGame(prefix)
+        samples.append(clock() - t0)
+    results["load"] = summarize(samples)
+
+    samples = []
+    for _ in range(repeat):
+        t0 = clock()
+        game.getObjects()
+        samples.append(clock() - t0)
+    results["getObjects"] = summarize(samples)
+
+    samples = []
+    for _ in range(repeat):
+        t0 = clock()
+        game.getSynonyms()
+        samples.append(clock() - t0)
+    results["getSynonyms"] = summarize(samples)
+
+    script = walkCommands(game, commands, seed)
+    batch = 100
+    results["parseInput"] = summarize(timeBatches(game.parseInput, [(line,) for line in script], batch))
+
+    rooms = [game._rooms[name] for name in game._rooms]
+    inventory = dict.fromkeys(game._objects or ())
+    moves = [(verb, room, inventory) for room in rooms for verb, _, _ in room.getPassages()]
+    rand = random.Random(seed)
+    moves = [rand.choice(moves) for _ in range(commands)] if moves else []
+    if len(moves) >= batch:
+        results["determineNextPassage"] = summarize(timeBatches(game.determineNextPassage, moves, batch))
+
+    samples = []
+    for _ in range(max(1, repeat // 4)):
+        t0 = clock()
+        playCommands(game, script)
+        samples.append(len(script) / ((clock() - t0) / 1e9))
+    results["commandThroughput"] = summarize(samples, "commands/s")
+    return results
+
+def compareResults(results, baseline, tolerance):    #returns a list of regressions against a baseline
+    regressions = []
+    for prefix, metrics in results["worlds"].items():
+        for name, stats in metrics.items():
+            old = baseline.get("worlds", {}).get(prefix, {}).get(name)
+            if old is None:
+                continue
+            if stats["unit"] == "commands/s":
+                slower = stats["p50"] < old["p50"] * (1 - tolerance)
+            else:
+                slower = stats["p50"] > old["p50"] * (1 + tolerance)
+            if slower:
+                regressions.append("%s %s: p50 %.1f %s (baseline %.1f)"
+                                   % (prefix, name, stats["p50"], stats["unit"], old["p50"]))
+    return regressions
+
+def runBenchmarks(prefixes, repeat=20, commands=20000, seed=0, synthetic=()):    #returns the full JSON-ready report
+    worlds = {prefix: benchmarkWorld(prefix, repeat, commands, seed) for prefix in prefixes}
+    if synthetic:
+        with tempfile.TemporaryDirectory() as directory:
+            for rooms in synthetic:
+                prefix = os.path.join(directory, "Synthetic" + str(rooms))
+                generateWorld(prefix, rooms, seed=seed)
+                worlds["Synthetic" + str(rooms)] = benchmarkWorld(prefix, repeat, commands, seed)
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "worlds": worlds,
+    }
+
+# Startup code
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Adventure hot paths.")
+    parser.add_argument("prefixes", nargs="*", default=DEFAULT_PREFIXES, help="worlds to benchmark")
+    parser.add_argument("--repeat", type=int, default=20, help="samples for load, getObjects and getSynonyms")
+    parser.add_argument("--commands", type=int, default=20000, help="length of the generated command script")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--synthetic", type=int, action="append", default=[], metavar="ROOMS",
+                        help="also benchmark a generated world with this many rooms (repeatable)")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="compare against the stored baseline")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file (default " + DEFAULT_BASELINE + ")")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown of a median before it counts as a regression")
+    args = parser.parse_args()
+
+    report = runBenchmarks(args.prefixes, args.repeat, args.commands, args.seed, args.synthetic)
+    print(json.dumps(report, indent=2))
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.baseline) as f:
+            regressions = compareResults(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print("REGRESSION " + line, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,285 @@
+# File: AdvCompile.py
+
+"""
+This module compiles the text data files for an Adventure world into a
+single binary file and loads that file back by memory-mapping it.  The
+loader only decodes a room the first time it is used, so the cost of
+starting a game does not grow with the size of the world.
+
+The file is laid out as a header followed by these tables, all stored
+as little-endian unsigned 32-bit integers:
+
+    strings    offsets of each interned UTF-8 string, then the bytes
+    rooms      name, short description, first line, line count,
+               first passage, passage count
+    names      room numbers sorted by room name (for binary search)
+    lines      string ids of the long description lines
+    passages   verb, destination, key (NO_STRING if there is no key)
+    objects    name, description, initial location
+    synonyms   word, replacement
+"""
+
+import hashlib
+import mmap
+import struct
+import sys
+from collections.abc import Mapping
+
+from AdvGame import AdvGame
+from AdvRoom import AdvRoom
+from AdvObject import AdvObject
+import AdvFiles
+
+# Constants
+
+COMPILED_SUFFIX = ".advw"
+MAGIC = b"ADVW"
+VERSION = 1
+NO_STRING = 0xFFFFFFFF
+
+HEADER = struct.Struct("<4sHH32s15I")
+ROOM = struct.Struct("<6I")
+PASSAGE = struct.Struct("<3I")
+OBJECT = struct.Struct("<3I")
+SYNONYM = struct.Struct("<2I")
+INDEX = struct.Struct("<I")
+
+SOURCE_SUFFIXES = ["Rooms.txt", "Objects.txt", "Synonyms.txt"]
+
+def sourceDigest(prefix):    #returns the SHA-256 digest of the text files that define a world
+    digest = hashlib.sha256()
+    for suffix in SOURCE_SUFFIXES:
+        digest.update(suffix.encode())
+        try:
+            with open(prefix + suffix, "rb") as f:
+                data = f.read()
+            digest.update(struct.pack("<Q", len(data)))
+            digest.update(data)
+        except FileNotFoundError:
+            digest.update(b"-")
+    return digest.digest()
+
+def compileWorld(prefix, path=None):    #compiles the world with the given prefix and returns the file name
+    if path is None:
+        path = prefix + COMPILED_SUFFIX
+    writeWorld(AdvGame(prefix), path, sourceDigest(prefix))
+    return path
+
+def writeWorld(game, path, digest):    #compiles a loaded game; readers never see a partly written file
+    data = encodeWorld(game.getPrefix(), game.getRooms().values(), game._objects or {},
+                       game._synonyms, digest)
+    AdvFiles.writeAtomically(path, data)
+
+def encodeWorld(prefix, rooms, objects, synonyms, digest):   #returns the bytes of a compiled world
+    strings = {}
+
+    def intern(s):
+        if s is None:
+            return NO_STRING
+        sid = strings.get(s)
+        if sid is None:
+            sid = len(strings)
+            strings[s] = sid
+        return sid
+
+    prefix_id = intern(prefix)
+    room_table = bytearray()
+    line_table = bytearray()
+    passage_table = bytearray()
+    names = []
+    nlines = 0
+    npassages = 0
+    for room in rooms:
+        longdesc = room.getLongDescription()
+        passages = room.getPassages()
+        room_table += ROOM.pack(intern(room.getName()), intern(room.getShortDescription()),
+                                nlines, len(longdesc), npassages, len(passages))
+        names.append(room.getName())
+        for line in longdesc:
+            line_table += INDEX.pack(intern(line))
+        for verb, dest, key in passages:
+            passage_table += PASSAGE.pack(intern(verb), intern(dest), intern(key))
+        nlines += len(longdesc)
+        npassages += len(passages)
+
+    order = sorted(range(len(names)), key=names.__getitem__)
+    name_table = b"".join(INDEX.pack(i) for i in order)
+
+    object_table = bytearray()
+    for obj in objects.values():
+        object_table += OBJECT.pack(intern(obj.getName()), intern(obj.getDescription()),
+                                    intern(obj.getInitialLocation()))
+    synonym_table = bytearray()
+    for word, replacement in synonyms.items():
+        synonym_table += SYNONYM.pack(intern(word), intern(replacement))
+
+    blob = bytearray()
+    offsets = bytearray()
+    for s in strings:
+        offsets += INDEX.pack(len(blob))
+        blob += s.encode("utf-8")
+    offsets += INDEX.pack(len(blob))
+    string_table = bytes(offsets) + bytes(blob)
+
+    sections = [string_table, room_table, name_table, line_table,
+                passage_table, object_table, synonym_table]
+    starts = []
+    pos = HEADER.size
+    for section in sections:
+        starts.append(pos)
+        pos += len(section)
+    header = HEADER.pack(MAGIC, VERSION, 0, digest, prefix_id,
+                         len(strings), len(names), nlines, npassages,
+                         len(objects), len(synonyms), *starts, 0)
+    return header + b"".join(sections)
+
+class CompiledWorld:
+
+    def __init__(self, path):
+        """Memory-maps a compiled world file."""
+        self._path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        fields = HEADER.unpack_from(self._map, 0)
+        if fields[0] != MAGIC or fields[1] != VERSION:
+            raise ValueError("Not a compiled Adventure world: " + path)
+        (self._digest, prefix_id, self._nstrings, self._nrooms, _, self._npassages,
+         self._nobjects, self._nsynonyms, self._strings_at, self._rooms_at,
+         self._names_at, self._lines_at, self._passages_at, self._objects_at,
+         self._synonyms_at, _) = fields[3:]
+        self._blob_at = self._strings_at + 4 * (self._nstrings + 1)
+        self._decoded = {}
+        self._prefix = self.getString(prefix_id)
+
+    def getPrefix(self):
+        return self._prefix
+
+    def getDigest(self):    #returns the digest of the text files this world was compiled from
+        return self._digest
+
+    def getString(self, sid):     #decodes an interned string; each string is decoded at most once
+        if sid == NO_STRING:
+            return None
+        s = self._decoded.get(sid)
+        if s is None:
+            start, end = struct.unpack_from("<2I", self._map, self._strings_at + 4 * sid)
+            s = str(self._map[self._blob_at + start:self._blob_at + end], "utf-8")
+            self._decoded[sid] = s
+        return s
+
+    def getRoomCount(self):
+        return self._nrooms
+
+    def getRoomName(self, index):
+        return self.getString(INDEX.unpack_from(self._map, self._rooms_at + ROOM.size * index)[0])
+
+    def findRoom(self, name):     #returns the number of the named room or -1, using the sorted name table
+        lo = 0
+        hi = self._nrooms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            index = INDEX.unpack_from(self._map, self._names_at + 4 * mid)[0]
+            found = self.getRoomName(index)
+            if found == name:
+                return index
+            if found < name:
+                lo = mid + 1
+            else:
+                hi = mid
+        return -1
+
+    def readRoom(self, index):    #builds the AdvRoom stored at the given index
+        name, shortdesc, first_line, nlines, first_passage, npassages = \
+            ROOM.unpack_from(self._map, self._rooms_at + ROOM.size * index)
+        longdesc = []
+        for i in range(first_line, first_line + nlines):
+            longdesc.append(self.getString(INDEX.unpack_from(self._map, self._lines_at + 4 * i)[0]))
+        passages = []
+        for i in range(first_passage, first_passage + npassages):
+            verb, dest, key = PASSAGE.unpack_from(self._map, self._passages_at + PASSAGE.size * i)
+            passages.append((self.getString(verb), self.getString(dest), self.getString(key)))
+        return AdvRoom(self.getString(name), self.getString(shortdesc), longdesc, passages)
+
+    def getVerbs(self):     #returns the distinct passage verbs, read straight from the passage table
+        sids = set()
+        for i in range(self._npassages):
+            sids.add(INDEX.unpack_from(self._map, self._passages_at + PASSAGE.size * i)[0])
+        return [self.getString(sid) for sid in sids]
+
+    def getObjects(self):    #returns the dictionary of objects
+        objects = {}
+        for i in range(self._nobjects):
+            name, description, location = OBJECT.unpack_from(self._map, self._objects_at + OBJECT.size * i)
+            obj = AdvObject(self.getString(name), self.getString(description), self.getString(location))
+            objects[obj.getName()] = obj
+        return objects
+
+    def getSynonyms(self):    #returns the dictionary of synonyms
+        synonyms = {}
+        for i in range(self._nsynonyms):
+            word, replacement = SYNONYM.unpack_from(self._map, self._synonyms_at + SYNONYM.size * i)
+            synonyms[self.getString(word)] = self.getString(replacement)
+        return synonyms
+
+class CompiledRooms(Mapping):
+
+    def __init__(self, world):
+        """Creates a read-only room mapping that decodes rooms when first used."""
+        self._world = world
+        self._rooms = {}
+
+    def __getitem__(self, name):
+        room = self._rooms.get(name)
+        if room is None:
+            index = self._world.findRoom(name)
+            if index == -1:
+                raise KeyError(name)
+            room = self._world.readRoom(index)
+            self._rooms[name] = room
+        return room
+
+    def __contains__(self, name):
+        return name in self._rooms or self._world.findRoom(name) != -1
+
+    def __iter__(self):     #room names in file order, so the first one is the start room
+        for i in range(self._world.getRoomCount()):
+            yield self._world.getRoomName(i)
+
+    def __len__(self):
+        return self._world.getRoomCount()
+
+    def getVerbs(self):
+        return self._world.getVerbs()
+
+def loadGame(path):    #returns an AdvGame that plays the compiled world in the given file
+    return gameFromWorld(CompiledWorld(path))
+
+def gameFromWorld(world):
+    return AdvGame(world.getPrefix(), rooms=CompiledRooms(world),
+                   objects=world.getObjects(), synonyms=world.getSynonyms(), validate=False)
+
+def loadCachedGame(prefix, path=None):   #returns a game from the compiled cache, rebuilding it if the text files changed
+    if path is None:
+        path = prefix + COMPILED_SUFFIX
+    digest = sourceDigest(prefix)
+    try:
+        world = CompiledWorld(path)
+        if world.getDigest() == digest and world.getPrefix() == prefix:
+            return gameFromWorld(world)
+    except (OSError, ValueError, struct.error):
+        pass        #a missing or damaged cache is rebuilt below
+    game = AdvGame(prefix)
+    try:
+        writeWorld(game, path, digest)
+    except OSError:
+        pass        #the game still runs if the cache cannot be written
+    return game
+
+# Build command: python AdvCompile.py Crowther Small ...
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("usage: python AdvCompile.py PREFIX...")
+        sys.exit(2)
+    for prefix in sys.argv[1:]:
+        print("Compiled " + compileWorld(prefix))
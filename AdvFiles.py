@@ -0,0 +1,32 @@
+# File: AdvFiles.py
+
+"""
+This module writes files that other processes may be reading.  The data
+goes to a temporary file next to the target, which is synced to disk and
+then renamed over the target, so a reader (or a crash) only ever sees the
+old file or the new one, never a partly written mix of the two.  The
+directory is synced after the rename, so the new file is the one that
+survives a power failure.
+"""
+
+import os
+
+def writeAtomically(path, data):    #replaces the file at path with data in one step
+    temp = path + ".%d.tmp" % os.getpid()
+    try:
+        with open(temp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, path)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+    syncDirectory(os.path.dirname(path) or ".")
+
+def syncDirectory(path):    #makes a rename in a directory survive a power failure
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
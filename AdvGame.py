@@ -5,9 +5,17 @@ This module defines the AdvGame class, which records the information
 necessary to play a game.
 """
 
+import os
+import re
+import sys
+import zlib
+
 from AdvRoom import AdvRoom
-from tokenscanner import TokenScanner
 from AdvObject import AdvObject
+from AdvSession import AdvSession, PLAYER
+from AdvOutput import TerminalSink
+from AdvVocabulary import AdvVocabulary
+import AdvSnapshot
 
 # Constants
 HELP_TEXT = [
@@ -31,22 +39,47 @@ HELP_TEXT = [
     "want to end your adventure, say QUIT."
 ]
 
+SAVE_SUFFIX = ".sav"
+DEFAULT_SAVE_NAME = "ADVENTURE"
+SAVE_NAME = re.compile(r"[A-Za-z0-9]+")        #names of saved games; never a path
+FILE_COMMANDS = ("SAVE", "RESTORE")     #their item is a file name, not an object
+BUILTIN_COMMANDS = ("QUIT", "LOOK", "HELP", "INVENTORY", "DROP", "TAKE", "SAVE", "RESTORE")
+
+# Splits a command the same way as a TokenScanner that ignores whitespace:
+# runs of letters and digits are words and any other character stands alone
+COMMAND_TOKENS = re.compile(r"[^\W_]+|\S")
+
 class AdvGame:
 
-    def __init__(self, prefix):
+    def __init__(self, prefix, rooms=None, objects=None, synonyms=None, validate=True):
         self._prefix = prefix
-        self._rooms = {}
-        self._start_room = None
-
-        with open(prefix + "Rooms.txt") as f:
+        if rooms is None:
+            rooms = self.readRooms()
+        self._rooms = rooms     #any mapping from room name to AdvRoom, in file order
+        self._start_room = next(iter(rooms), None)
+
+        # the world is read once here and shared by every session
+        self._objects = self.getObjects() if objects is None else objects
+        self._synonyms = self.getSynonyms() if synonyms is None else synonyms
+        self.assignObjects(self._objects)
+        self._room_names = None     #numbering of rooms and objects, built when first needed
+        self._forced_exits = {}     #FORCED room name -> the passages it can take, in order
+        self._vocabulary = None     #built when the first command is parsed
+        self._save_dir = "."        #where SAVE and RESTORE keep games; None disables them
+        if validate:
+            problems = self.validateWorld()
+            if problems:
+                raise ValueError("Invalid world " + prefix + ":\n" + "\n".join(problems))
+
+    def readRooms(self):    #returns a dictionary of the rooms in the data file
+        rooms = {}
+        with open(self._prefix + "Rooms.txt") as f:
             while True:
                 room = AdvRoom.readRoom(f)
                 if room is None:
                     break
-                name = room.getName()
-                if self._start_room is None:
-                    self._start_room = name
-                self._rooms[name] = room
+                rooms[room.getName()] = room
+        return rooms
 
     def getObjects(self):   #returns object name with a dictionary of what it has (name, description, location)
         self._objects = {}
@@ -75,185 +108,398 @@ class AdvGame:
         except FileNotFoundError:
             return self._synonyms
 
-    def printRooms(self, room):      #takes the room and either prints the long or short description
-        if room.hasBeenVisited():
-            print(room.getShortDescription())
+    def validateWorld(self):    #checks every passage and every FORCED room; returns a list of problems
+        rooms = self._rooms
+        problems = []
+        forced = []
+        for name in rooms:
+            room = rooms[name]
+            if room.isForced():
+                forced.append(name)
+            for verb, dest, key in room.getPassages():
+                if dest == "EXIT":
+                    if verb != "FORCED":
+                        problems.append(name + ": only FORCED passages can lead to EXIT")
+                elif dest not in rooms:
+                    problems.append(name + ": " + verb + " leads to missing room " + dest)
+        for name in forced:
+            exits = self.getForcedExits(name)
+            if exits and exits[-1][0] is not None:
+                problems.append(name + ": no FORCED passage applies when not carrying "
+                                + " ".join(sorted({key for key, _ in exits})))
+        problems.extend(self.findForcedLoops(forced))
+        return list(dict.fromkeys(problems))
+
+    def getForcedExits(self, room_name):     #returns the (key or None, destination or None for EXIT) pairs a FORCED room can take
+        exits = self._forced_exits.get(room_name)
+        if exits is None:
+            exits = []
+            for dest, key in self._rooms[room_name].getExits("FORCED"):
+                exits.append((key, None if dest == "EXIT" else dest))
+                if key is None:
+                    break       #the passages after this one are never taken
+            exits = self._forced_exits[room_name] = tuple(exits)
+        return exits
+
+    def findForcedLoops(self, forced):    #returns a problem for each loop the FORCED passages of the given rooms could follow
+        # keys are not tracked along the way, so a loop is reported even if no inventory could follow all of it
+        rooms = self._rooms
+        problems = []
+        state = {}      #forced room -> True while it is on the path, False once everything after it is checked
+        for start in forced:
+            if start in state:
+                continue
+            path = [start]
+            state[start] = True
+            stack = [iter(self.getForcedExits(start))]
+            while stack:
+                for _, dest in stack[-1]:
+                    if dest is None or dest not in rooms or not rooms[dest].isForced():
+                        continue
+                    if state.get(dest):
+                        problems.append(dest + ": FORCED passages loop back through "
+                                        + " -> ".join(path[path.index(dest):]))
+                    elif dest not in state:
+                        state[dest] = True
+                        path.append(dest)
+                        stack.append(iter(self.getForcedExits(dest)))
+                        break
+                else:
+                    state[path.pop()] = False
+                    stack.pop()
+        return problems
+
+    def followForcedChain(self, room_name, inventory):    #returns (forced rooms passed, final room or None for EXIT)
+        rooms = self._rooms
+        limit = len(rooms)
+        passed = []
+        name = room_name
+        while name is not None and rooms[name].isForced():
+            if len(passed) > limit:     #only possible in a world that was not validated
+                raise ValueError(room_name + ": FORCED passages loop")
+            passed.append(name)
+            for key, dest in self.getForcedExits(name):
+                if key is None or key in inventory:
+                    name = dest
+                    break
+            else:
+                raise ValueError(name + ": no FORCED passage applies")
+        return tuple(passed), name
+
+    def getVocabulary(self):     #returns the AdvVocabulary of commands, passage verbs, objects and synonyms
+        if self._vocabulary is None:
+            rooms = self._rooms
+            if hasattr(rooms, "getVerbs"):      #lazily loaded worlds list their verbs without parsing every room
+                verbs = set(rooms.getVerbs())
+            else:
+                verbs = {verb for name in rooms for verb, _, _ in rooms[name].getPassages()}
+            verbs.discard("FORCED")     #taken by the game itself, never typed
+            verbs.update(BUILTIN_COMMANDS)
+            self._vocabulary = AdvVocabulary(verbs, self._objects or (), self._synonyms)
+        return self._vocabulary
+
+    def setVocabulary(self, vocabulary):     #uses an equal vocabulary shared with another world
+        self._vocabulary = vocabulary
+
+    def internStrings(self):     #shares descriptions and words with identical ones in other worlds
+        if type(self._rooms) is dict:       #rooms parsed on demand are left alone
+            for room in self._rooms.values():
+                room.internDescriptions()
+        for obj in (self._objects or {}).values():
+            obj.internDescription()
+        intern = sys.intern
+        self._synonyms = {intern(word): intern(replacement) for word, replacement in self._synonyms.items()}
+
+    def setSaveDirectory(self, path):    #sets the directory saved games are kept in, or None to disable SAVE and RESTORE
+        self._save_dir = path
+
+    def getSavePath(self, item):    #returns the file for a saved game name, or None if the name is not allowed
+        name = DEFAULT_SAVE_NAME if item is None else item
+        if self._save_dir is None or not SAVE_NAME.fullmatch(name):
+            return None
+        return os.path.join(self._save_dir, name.lower() + SAVE_SUFFIX)
+
+    def getPrefix(self):
+        return self._prefix
+
+    def getRooms(self):     #returns the read-only mapping from room name to AdvRoom
+        return self._rooms
+
+    def getStartRoom(self):
+        return self._start_room
+
+    def getInitialInventory(self):      #returns the objects a new player carries
+        return self._initial_inventory
+
+    def numberWorld(self):      #numbers the rooms and objects in file order
+        self._room_names = list(self._rooms)
+        self._room_index = {name: i for i, name in enumerate(self._room_names)}
+        self._object_names = list(self._objects or ())
+        self._object_index = {name: i for i, name in enumerate(self._object_names)}
+        self._world_id = zlib.crc32("\n".join(self._room_names + [""] + self._object_names).encode())
+
+    def getRoomIndex(self, room_name):      #returns the number of a room
+        if self._room_names is None:
+            self.numberWorld()
+        return self._room_index[room_name]
+
+    def getRoomNameAt(self, index):
+        if self._room_names is None:
+            self.numberWorld()
+        return self._room_names[index]
+
+    def getObjectIndex(self, objname):      #returns the number of an object
+        if self._room_names is None:
+            self.numberWorld()
+        return self._object_index[objname]
+
+    def getObjectNameAt(self, index):
+        if self._room_names is None:
+            self.numberWorld()
+        return self._object_names[index]
+
+    def getWorldId(self):       #returns a checksum of the room and object names, used to match saved games to worlds
+        if self._room_names is None:
+            self.numberWorld()
+        return self._world_id
+
+    def newSession(self, output=None):     #creates the state for a new player; no file is read
+        if output is None:
+            output = TerminalSink()
+        return AdvSession(self._start_room, self._initial_contents, self._initial_inventory, output,
+                          self._initial_locations)
+
+    def resetSession(self, session):     #puts a session back to the start of the game
+        session.reset(self._start_room, self._initial_inventory)
+
+    def printRooms(self, room, session):      #takes the room and either prints the long or short description
+        name = room.getName()
+        if session.hasBeenVisited(name):
+            session.getOutput().println(room.getShortDescription())
+        else:
+            session.getOutput().write(room.getLongText())
+            session.setVisited(name, True)
+
+    def describeRoom(self, room, session):     #prints the room as printRooms does, then its objects, in one write
+        name = room.getName()
+        if session.hasBeenVisited(name):
+            text = room.getShortDescription() + "\n"
         else:
-            for line in room.getLongDescription():
-                print(line)
-            room.setVisited(True)
+            text = room.getLongText()
+            session.setVisited(name, True)
+        session.getOutput().write(text + self.getObjectText(name, session))
 
-    def assignObjects(self, objs, inventory):        #assigns objects to its initial room locations (including PLAYER)
+    def assignObjects(self, objs):        #records the initial room locations of the objects (including PLAYER)
+        contents = {}
+        inventory = []
         if objs is not None:
             for obj in objs.values():
                 objname = obj.getName()
                 objlocation = obj.getInitialLocation()
                 if objlocation in self._rooms:
-                    self._rooms[objlocation].addObject(objname)
-                if objlocation == "PLAYER":
+                    contents.setdefault(objlocation, []).append(objname)
+                if objlocation == PLAYER:
                     inventory.append(objname)
-
-    def printObjectDescription(self, objs, room):     #prints obj description if obj is in that room
-        if objs is not None:
-            for objname in room.getContents():
-                if objname in objs:
-                    print("There is " + objs[objname].getDescription() + " here.")
-
-    def determineNextPassage(self, command, passages, inventory):     #determines which passage to go thru based upon items in inventory
-        for passage in passages:
-            if command == passage[0]:
-                if passage[2] is None:
-                    return passage[1]
-                else:
-                    try:
-                        ind = inventory.index(passage[2])
-                    except ValueError:
-                        ind = -1
-                    if ind != -1:
-                        return passage[1]
-                    else:
-                        continue
-
-    def moveToRoom(self, room_name, inventory, objs, force_long_desc=False, from_forced=False):   #move to a room and handle any forced passages. Returns the final room after all forced movements.
+        self._initial_contents = {name: tuple(objnames) for name, objnames in contents.items()}
+        self._initial_inventory = tuple(inventory)
+        self._initial_locations = {objname: name for name, objnames in contents.items() for objname in objnames}
+        self._initial_locations.update(dict.fromkeys(inventory, PLAYER))
+        # rendered here rather than on first use, so the world is never written to while it is played
+        self._object_text = {name: self.renderContents(objnames) for name, objnames in self._initial_contents.items()}
+
+    def printObjectDescription(self, room, session):     #prints obj description if obj is in that room
+        session.getOutput().write(self.getObjectText(room.getName(), session))
+
+    def getObjectText(self, room_name, session):     #returns the "There is ... here." lines for a room, rendered once
+        if session.getChangedContents(room_name) is not None:
+            text = session.getContentsText(room_name)
+            if text is None:
+                text = self.renderContents(session.getContents(room_name))
+                session.setContentsText(room_name, text)
+        else:       #the same for every session that has not changed the room
+            text = self._object_text.get(room_name, "")
+        return text
+
+    def renderContents(self, objnames):
+        objs = self._objects
+        return "".join(["There is " + objs[objname].getDescription() + " here.\n" for objname in objnames])
+
+    def determineNextPassage(self, command, room, inventory):     #determines which passage to go thru based upon items in inventory
+        return room.findExit(command, inventory)
+
+    def moveToRoom(self, room_name, session, force_long_desc=False, from_forced=False):   #move to a room and handle any forced passages. Returns the final room after all forced movements.
 
         room = self._rooms[room_name]
 
-        # check if this room has a forced passage
-        passages = room.getPassages()
-        has_forced = any(passage[0] == "FORCED" for passage in passages)
+        if room.isForced():
+            passed, final = self.followForcedChain(room_name, session.getInventory())
 
-        if has_forced:
             # for forced rooms, always show long description (the message)
-            room.setVisited(False)
-            self.printRooms(room)
-
-            for passage in passages:
-                if passage[0] == "FORCED":
-                    next_room = self.determineNextPassage("FORCED", passages, inventory)
-                    if next_room == "EXIT":
-                        return None
-                    #recursively move to forced destination, but don't print its description
-                    return self.moveToRoom(next_room, inventory, objs, force_long_desc=False, from_forced=True)
+            for name in passed:
+                session.setVisited(name, False)
+                self.printRooms(self._rooms[name], session)
+            if final is None:
+                return None
+            #don't print the description of the room the chain ends in
+            return self._rooms[final]
 
         else:
             #normal room
             if force_long_desc:
-                room.setVisited(False)
+                session.setVisited(room_name, False)
 
             #only print description if we're not arriving via a forced passage
             if not from_forced:
-                self.printRooms(room)
-                self.printObjectDescription(objs, room)
+                self.describeRoom(room, session)
 
         return room
 
-    def handleMovement(self, command, room, inventory, objs):    #handle movement commands and return the new room
+    def handleMovement(self, command, room, session):    #handle movement commands and return the new room
+
+        if not room.hasWildcard() and not self.getVocabulary().isVerb(command):
+            # no passage anywhere uses this word, so there is nothing to look for
+            session.getOutput().println("I don't know how to apply that word here.")
+            return room
 
-        passages = room.getPassages()
-        next_room = self.determineNextPassage(command, passages, inventory)
+        inventory = session.getInventory()
+        next_room = self.determineNextPassage(command, room, inventory)
 
         if next_room is None:
             # check for * passage
-            for passage in passages:
-                if passage[0] == "*":
-                    wildcard_dest = self.determineNextPassage("*", passages, inventory)
-                    if wildcard_dest:
-                        return self.moveToRoom(wildcard_dest, inventory, objs)
-                    break
-            print("I don't know how to apply that word here.")
+            if room.hasWildcard():
+                wildcard_dest = self.determineNextPassage("*", room, inventory)
+                if wildcard_dest:
+                    return self.moveToRoom(wildcard_dest, session)
+            session.getOutput().println("I don't know how to apply that word here.")
             return room
         else:
-            return self.moveToRoom(next_room, inventory, objs)
+            return self.moveToRoom(next_room, session)
 
     def parseInput(self, answer):     # parse user input and return (command, item) tuple
 
-        synonyms = self._synonyms  # Use synonyms
-        scanner = TokenScanner(answer)
-        scanner.ignoreWhitespace()
-
-        inputlist = []
-        while scanner.hasMoreTokens():
-            token = scanner.nextToken()
-            inputlist.append(token)
+        vocabulary = self.getVocabulary()  # synonyms and abbreviations
+        inputlist = COMMAND_TOKENS.findall(answer)
 
-        # apply synonyms
-        for i in range(len(inputlist)):
-            if inputlist[i] in synonyms:
-                inputlist[i] = synonyms[inputlist[i]]
-
-        command = inputlist[0].upper() if len(inputlist) > 0 else ""
-        item = inputlist[1].upper() if len(inputlist) > 1 else None
+        command = vocabulary.resolveCommand(inputlist[0]).upper() if len(inputlist) > 0 else ""
+        if len(inputlist) < 2:
+            item = None
+        elif command in FILE_COMMANDS:
+            item = inputlist[1].upper()     #the name as typed, without synonyms or abbreviations
+        else:
+            item = vocabulary.resolveItem(inputlist[1]).upper()
 
         return command, item
 
-    def handleLook(self, room, objs):   #handle look command
-        for line in room.getLongDescription():
-            print(line)
-        self.printObjectDescription(objs, room)
+    def handleLook(self, room, session):   #handle look command
+        session.getOutput().write(room.getLongText() + self.getObjectText(room.getName(), session))
 
-    def handleHelp(self):   #handle help command
-        for line in HELP_TEXT:
-            print(line)
+    def handleHelp(self, session):   #handle help command
+        session.getOutput().printLines(HELP_TEXT)
 
-    def handleInventory(self, inventory, objs):   #handle inventory command
+    def handleInventory(self, session):   #handle inventory command
+        inventory = session.getInventory()
+        objs = self._objects
+        out = session.getOutput()
         if len(inventory) == 0:
-            print("You are empty-handed")
+            out.println("You are empty-handed")
         else:
-            print("You are carrying:")
+            out.println("You are carrying:")
             for item_name in inventory:
-                if item_name in objs:
-                    print("\t" + objs[item_name].getDescription())
+                out.println("\t" + objs[item_name].getDescription())
 
-    def handleDrop(self, item, room, inventory):   #handle drop command
+    def handleDrop(self, item, room, session):   #handle drop command
         if item is None:
-            print("You must specify what to drop.")
-        elif item in inventory:
-            room.addObject(item)
-            inventory.remove(item)
-            print("Dropped")
+            session.getOutput().println("You must specify what to drop.")
+        elif session.isCarrying(item):
+            session.addObject(room.getName(), item)
+            session.removeFromInventory(item)
+            session.getOutput().println("Dropped")
         else:
-            print("I don't know what that is.")
+            session.getOutput().println("I don't know what that is.")
 
-    def handleTake(self, item, room, inventory):    #handle take command
+    def handleTake(self, item, room, session):    #handle take command
         if item is None:
-            print("You must specify what to take.")
-        elif room.containsObject(item):
-            inventory.append(item)
-            room.removeObject(item)
-            print("Taken")
+            session.getOutput().println("You must specify what to take.")
+        elif session.containsObject(room.getName(), item):
+            session.addToInventory(item)
+            session.removeObject(room.getName(), item)
+            session.getOutput().println("Taken")
         else:
-            print("I don't know what that is.")
+            session.getOutput().println("I don't know what that is.")
 
-    def processCommand(self, command, item, room, inventory, objs): #process a single command and return the next room. Returns none to signal game should quit
-        if command == "QUIT":
+    def handleSave(self, item, session):    #handle save command
+        path = self.getSavePath(item)
+        if path is None:
+            self.printBadSaveName(session)
+            return
+        try:
+            AdvSnapshot.saveSession(self, session, path)
+            session.getOutput().println("Saved")
+        except OSError:
+            session.getOutput().println("I can't save the game there.")
+
+    def handleRestore(self, item, room, session):    #handle restore command and return the restored room
+        path = self.getSavePath(item)
+        out = session.getOutput()
+        if path is None:
+            self.printBadSaveName(session)
+            return room
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            AdvSnapshot.restoreSnapshot(self, data, session)
+        except OSError:
+            out.println("I can't find that saved game.")
+            return room
+        except AdvSnapshot.SnapshotError:
+            out.println("That saved game doesn't belong to this cave.")
+            return room
+        out.println("Restored")
+        if session.getCurrentRoom() is None:
             return None
+        room = self._rooms[session.getCurrentRoom()]
+        self.describeRoom(room, session)
+        return room
+
+    def printBadSaveName(self, session):
+        if self._save_dir is None:
+            session.getOutput().println("Saved games are not available here.")
+        else:
+            session.getOutput().println("Saved games must be named with letters and digits only.")
+
+    def processCommand(self, command, item, session): #process a single command and return the next room. Returns none to signal game should quit
+        room = self._rooms[session.getCurrentRoom()]
+        if command == "QUIT":
+            room = None
         elif command == "LOOK":
-            self.handleLook(room, objs)
-            return room
+            self.handleLook(room, session)
         elif command == "HELP":
-            self.handleHelp()
-            return room
+            self.handleHelp(session)
         elif command == "INVENTORY":
-            self.handleInventory(inventory, objs)
-            return room
+            self.handleInventory(session)
         elif command == "DROP":
-            self.handleDrop(item, room, inventory)
-            return room
+            self.handleDrop(item, room, session)
         elif command == "TAKE":
-            self.handleTake(item, room, inventory)
-            return room
+            self.handleTake(item, room, session)
+        elif command == "SAVE":
+            self.handleSave(item, session)
+        elif command == "RESTORE":
+            room = self.handleRestore(item, room, session)
         else:
-            return self.handleMovement(command, room, inventory, objs)
+            room = self.handleMovement(command, room, session)
+        session.setCurrentRoom(None if room is None else room.getName())
+        return room
 
-    def run(self):     #main game loop
-        inventory = []
-        objs = self.getObjects()
-        self._synonyms = self.getSynonyms()  # Cache synonyms
-        self.assignObjects(objs, inventory)
+    def startSession(self, session):     #describes the starting room to a new player and returns it
+        room = self._rooms[session.getCurrentRoom()]
+        self.describeRoom(room, session)
+        return room
 
-        room = self._rooms[self._start_room]
-        self.printRooms(room)
-        self.printObjectDescription(objs, room)
+    def run(self):     #main game loop
+        session = self.newSession()
+        output = session.getOutput()
+        room = self.startSession(session)
+        output.flush()
 
         while room is not None:
             answer = input("> ").strip().upper()
@@ -262,4 +508,5 @@ class AdvGame:
             if not command:
                 continue
 
-            room = self.processCommand(command, item, room, inventory, objs)
\ No newline at end of file
+            room = self.processCommand(command, item, session)
+            output.flush()
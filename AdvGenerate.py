@@ -0,0 +1,113 @@
+# File: AdvGenerate.py
+
+"""
+This module writes synthetic worlds in the same text format as the
+Crowther and Small data files, so the loader and the movement code can
+be tested on worlds far larger than the ones that ship with the game.
+
+Every generated world is valid: each room has a passage to the next
+room, so all rooms are reachable, every key names a real object, every
+keyed passage is followed by an unkeyed one for the same verb, and
+every FORCED chain ends in an ordinary room.
+"""
+
+import argparse
+import random
+
+from AdvRoom import MARKER
+
+# Constants
+DIRECTIONS = ["NORTH", "SOUTH", "EAST", "WEST", "UP", "DOWN", "IN", "OUT",
+              "NE", "NW", "SE", "SW"]
+SYNONYMS = [("N", "NORTH"), ("S", "SOUTH"), ("E", "EAST"), ("W", "WEST"),
+            ("U", "UP"), ("D", "DOWN"), ("Q", "QUIT"), ("L", "LOOK"),
+            ("I", "INVENTORY"), ("CATCH", "TAKE"), ("RELEASE", "DROP")]
+WORDS = ["a", "narrow", "twisting", "passage", "damp", "cavern", "with",
+         "walls", "of", "limestone", "dim", "light", "filters", "from",
+         "above", "and", "water", "drips", "into", "shallow", "pools"]
+
+def generateWorld(prefix, rooms=1000, branching=4, keyed_ratio=0.1, forced_depth=3,
+                  forced_chains=None, object_density=0.5, description_lines=3, seed=0):
+    """Writes prefix + Rooms.txt, Objects.txt and Synonyms.txt and returns the room count."""
+    rand = random.Random(seed)
+    width = len(str(max(rooms - 1, 1)))
+    names = ["Room" + str(i).zfill(width) for i in range(rooms)]
+    if forced_depth <= 0:
+        forced_chains = 0       #a chain needs at least one room
+    elif forced_chains is None:
+        forced_chains = max(1, rooms // 100)
+    verbs = DIRECTIONS + ["PASSAGE" + str(i) for i in range(max(0, branching - len(DIRECTIONS)))]
+    nobjects = int(round(rooms * object_density))
+    objects = ["OBJ" + str(i) for i in range(nobjects)]
+
+    # each chain is entered from a random ordinary room and ends in another one
+    chains = {}
+    for c in range(forced_chains):
+        chain = ["Forced" + str(c) + "_" + str(d) for d in range(forced_depth)]
+        chains.setdefault(rand.randrange(rooms), []).append(chain)
+
+    with open(prefix + "Rooms.txt", "w") as f:
+        for i, name in enumerate(names):
+            f.write(name + "\n")
+            f.write("Room " + str(i) + "\n")
+            for _ in range(description_lines):
+                f.write(" ".join(rand.choice(WORDS) for _ in range(10)).capitalize() + "\n")
+            f.write(MARKER + "\n")
+            exits = rand.sample(verbs, min(branching, len(verbs)))
+            f.write(exits[0] + ": " + names[(i + 1) % rooms] + "\n")
+            for verb in exits[1:]:
+                dest = names[rand.randrange(rooms)]
+                if objects and rand.random() < keyed_ratio:
+                    f.write(verb + ": " + dest + "/" + rand.choice(objects) + "\n")
+                    dest = names[rand.randrange(rooms)]
+                f.write(verb + ": " + dest + "\n")
+            for c, chain in enumerate(chains.get(i, [])):
+                f.write("CHAIN" + str(c) + ": " + chain[0] + "\n")
+            f.write("\n")
+        for chains_here in chains.values():
+            for chain in chains_here:
+                for d, name in enumerate(chain):
+                    f.write(name + "\n-\n")
+                    f.write("You are swept along a passage (" + str(d + 1) + " of "
+                            + str(len(chain)) + ").\n")
+                    f.write(MARKER + "\n")
+                    if d + 1 < len(chain):
+                        dest = chain[d + 1]
+                    else:
+                        dest = names[rand.randrange(rooms)]
+                    if objects and rand.random() < keyed_ratio:
+                        f.write("FORCED: " + names[rand.randrange(rooms)] + "/" + rand.choice(objects) + "\n")
+                    f.write("FORCED: " + dest + "\n\n")
+
+    with open(prefix + "Objects.txt", "w") as f:
+        for i, obj in enumerate(objects):
+            location = "PLAYER" if i == 0 else names[rand.randrange(rooms)]
+            f.write(obj + "\n" + "a synthetic object numbered " + str(i) + "\n" + location + "\n\n")
+
+    with open(prefix + "Synonyms.txt", "w") as f:
+        for word, replacement in SYNONYMS:
+            f.write(word + "=" + replacement + "\n")
+        for i, obj in enumerate(objects[:100]):
+            f.write("THING" + str(i) + "=" + obj + "\n")
+
+    return rooms + forced_chains * forced_depth
+
+# Startup code
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic Adventure world.")
+    parser.add_argument("prefix", help="prefix of the files to write, such as Synthetic")
+    parser.add_argument("--rooms", type=int, default=1000, help="number of ordinary rooms")
+    parser.add_argument("--branching", type=int, default=4, help="passage verbs per room")
+    parser.add_argument("--keyed", type=float, default=0.1, help="fraction of passages that need a key")
+    parser.add_argument("--forced-depth", type=int, default=3, help="length of each FORCED chain")
+    parser.add_argument("--forced-chains", type=int, help="number of FORCED chains (default rooms/100)")
+    parser.add_argument("--objects", type=float, default=0.5, help="objects per room")
+    parser.add_argument("--lines", type=int, default=3, help="long description lines per room")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.forced_depth <= 0 and args.forced_chains:
+        parser.error("--forced-chains needs a positive --forced-depth")
+    total = generateWorld(args.prefix, args.rooms, args.branching, args.keyed, args.forced_depth,
+                          args.forced_chains, args.objects, args.lines, args.seed)
+    print("Wrote " + str(total) + " rooms to " + args.prefix + "Rooms.txt")
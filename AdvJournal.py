@@ -0,0 +1,279 @@
+# File: AdvJournal.py
+
+"""
+This module keeps an append-only journal of the commands players give,
+so that games survive a crash.  Each (command, item) pair handed to
+processCommand is appended as a small record; every SNAPSHOT_EVERY
+commands, and after every RESTORE, a full snapshot of the session (see
+AdvSnapshot) is appended instead, so recovering a session only replays
+the commands since its last snapshot.  SAVE is not journaled because it
+changes nothing in the session.
+
+Records are collected in memory and written with one write and one
+fsync per group commit.  In the server, every session that appends a
+record during the same turn of the event loop waits on the same fsync,
+so the cost per command stays small however many players there are.
+
+Each record is framed like a snapshot record (see AdvSnapshot.frameRecord):
+a header with the kind, the session id and the payload length, the
+payload, then a CRC-32.  Reading stops at the first damaged record, which
+is where a crash interrupted the last write.
+
+The journal is compacted when it is opened after recovery and whenever
+it grows past COMPACT_SIZE: it is replaced by one snapshot of every
+session still playing, so recovery never reads more than the commands
+since those snapshots.  After a failed write the file may be missing
+records or end in a torn one, so the next commit compacts it too.  A session whose snapshot no longer fits the
+world (because its data files changed) is dropped when it is recovered.
+"""
+
+import argparse
+import asyncio
+import os
+import struct
+
+import AdvFiles
+import AdvSnapshot
+from AdvGame import AdvGame
+from AdvOutput import NullSink, TerminalSink
+
+# Constants
+MAGIC = b"ADVJ"
+VERSION = 1
+START = 0
+COMMAND = 1
+SNAPSHOT = 2
+END = 3
+RECORD = struct.Struct("<4sBBQI")     #magic, version, kind, session id, payload length
+SNAPSHOT_EVERY = 100
+COMPACT_SIZE = 16 * 1024 * 1024     #bytes
+PROMPT = "> "
+
+def encodeRecord(kind, sid, payload=b""):
+    return AdvSnapshot.frameRecord(RECORD.pack(MAGIC, VERSION, kind, sid, len(payload)), payload)
+
+def encodeCommand(command, item):   #commands and items never contain tabs, since parseInput splits at whitespace
+    return (command if item is None else command + "\t" + item).encode("utf-8")
+
+def decodeCommand(payload):    #returns (command, item)
+    command, _, item = payload.decode("utf-8").partition("\t")
+    return command, item if _ else None
+
+def readJournal(data):     #yields (kind, session id, payload) up to the first damaged record
+    for (_, _, kind, sid, _), payload in AdvSnapshot.readFrames(data, RECORD, MAGIC, VERSION):
+        yield kind, sid, payload
+
+class Journal:
+
+    def __init__(self, game, path, snapshot_every=SNAPSHOT_EVERY, compact_size=COMPACT_SIZE):
+        """Opens a journal for appending; records only reach the file when they are committed."""
+        self._game = game
+        self._path = path
+        self._file = open(path, "ab")
+        self._size = self._file.tell()
+        self._compacted_size = self._size       #size just after the last compaction
+        self._damaged = False       #a write failed, so the file may have lost records or end in a torn one
+        self._snapshot_every = snapshot_every
+        self._compact_size = compact_size
+        self._pending = bytearray()
+        self._sessions = {}         #session id -> session, for the sessions still playing
+        self._counts = {}           #session id -> commands since its last snapshot
+        self._waiters = []          #futures of sessions waiting for the next group commit
+        self._flushing = False
+
+    def startSession(self, session):     #journals a new session (after startSession) and returns its id
+        sid = int.from_bytes(os.urandom(8), "little")     #unique across workers and restarts
+        self._pending += encodeRecord(START, sid)
+        self._sessions[sid] = session
+        self._counts[sid] = 0
+        return sid
+
+    def resumeSession(self, sid, session):     #continues journaling a recovered session from a fresh snapshot
+        self._sessions[sid] = session
+        self.writeSnapshot(sid, session)
+
+    def getSessions(self):     #returns {session id: session} for the sessions still playing
+        return self._sessions
+
+    def record(self, sid, session, command, item):     #journals a command after processCommand has handled it
+        if session.getCurrentRoom() is None:
+            self.endSession(sid)
+        elif command == "RESTORE" or self._counts[sid] + 1 >= self._snapshot_every:
+            self.writeSnapshot(sid, session)     #a restored game depends on a file that may change
+        elif command != "SAVE":
+            self._pending += encodeRecord(COMMAND, sid, encodeCommand(command, item))
+            self._counts[sid] += 1
+
+    def writeSnapshot(self, sid, session):
+        self._pending += encodeRecord(SNAPSHOT, sid, AdvSnapshot.encodeSnapshot(self._game, session))
+        self._counts[sid] = 0
+
+    def endSession(self, sid):      #marks a session as finished; recovery skips it
+        self._pending += encodeRecord(END, sid)
+        self._sessions.pop(sid, None)
+        self._counts.pop(sid, None)
+
+    def flush(self):     #writes and fsyncs every pending record
+        write, data = self.takePending()
+        if write is not None:
+            self.writeOrMarkDamaged(write, data)
+
+    def writeOrMarkDamaged(self, write, data):     #calls write(data), remembering a failure so the file is rewritten
+        try:
+            write(data)
+        except OSError:
+            self._damaged = True     #the next commit rewrites the journal from the sessions themselves
+            raise
+
+    def takePending(self):     #returns (method that writes data, data) for the pending records, or (None, None)
+        if self._damaged or self._size + len(self._pending) > self._compacted_size + self._compact_size:
+            return self.replaceData, self.encodeSessions()
+        if not self._pending:
+            return None, None
+        data = bytes(self._pending)
+        self._pending.clear()
+        return self.writeData, data
+
+    def encodeSessions(self):     #returns a snapshot of every session still playing, in place of the pending records
+        self._pending.clear()
+        data = bytearray()
+        for sid, session in self._sessions.items():
+            data += encodeRecord(SNAPSHOT, sid, AdvSnapshot.encodeSnapshot(self._game, session))
+            self._counts[sid] = 0
+        return bytes(data)
+
+    def compact(self):     #replaces the journal with one snapshot of every session still playing
+        self.replaceData(self.encodeSessions())
+
+    def writeData(self, data):
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._size += len(data)
+
+    def replaceData(self, data):     #replaces the whole journal with data
+        AdvFiles.writeAtomically(self._path, data)
+        self._file.close()
+        self._file = open(self._path, "ab")
+        self._size = self._compacted_size = len(data)
+        self._damaged = False
+
+    async def commit(self):     #waits until every record appended so far is on disk
+        if not self._pending and not self._flushing and not self._damaged:
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        if not self._flushing:
+            self._flushing = True
+            asyncio.get_running_loop().create_task(self.groupCommit())
+        await future
+
+    async def groupCommit(self):      #one write and fsync for all the sessions waiting, repeated while more arrive
+        loop = asyncio.get_running_loop()
+        try:
+            while self._waiters:
+                waiters = self._waiters
+                self._waiters = []
+                write, data = self.takePending()
+                try:
+                    if write is not None:
+                        await loop.run_in_executor(None, self.writeOrMarkDamaged, write, data)
+                except OSError as e:
+                    for future in waiters:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for future in waiters:
+                    if not future.done():
+                        future.set_result(None)
+        finally:
+            self._flushing = False
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+def recover(game, path, output=None):    #returns {session id: session} for the journaled games that never ended
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return {}
+    starts = {}     #session id -> (snapshot or None for a new game, [(command, item), ...] since then)
+    for kind, sid, payload in readJournal(data):
+        if kind == START:
+            starts[sid] = (None, [])
+        elif kind == SNAPSHOT:
+            starts[sid] = (payload, [])
+        elif kind == COMMAND and sid in starts:
+            starts[sid][1].append(decodeCommand(payload))
+        elif kind == END:
+            starts.pop(sid, None)
+    sessions = {}
+    for sid, (snapshot, commands) in starts.items():
+        if snapshot is None:
+            session = game.newSession(NullSink())
+            game.startSession(session)
+        else:
+            try:
+                session = AdvSnapshot.restoreSnapshot(game, snapshot, output=NullSink())
+            except AdvSnapshot.SnapshotError:
+                continue        #saved in a world whose data files have since changed
+        for command, item in commands:      #replayed without output
+            game.processCommand(command, item, session)
+        session.setOutput(NullSink() if output is None else output)
+        sessions[sid] = session
+    return sessions
+
+def openJournal(game, path, output=None):    #recovers the unfinished games in a journal and returns (Journal, {session id: session})
+    recovered = recover(game, path, output)
+    journal = Journal(game, path)
+    for sid, session in recovered.items():
+        journal.resumeSession(sid, session)
+    journal.compact()
+    return journal, recovered
+
+def runJournaled(game, path):     #plays a terminal game that resumes after a crash
+    journal, recovered = openJournal(game, path, TerminalSink())
+    if recovered:
+        sid, session = recovered.popitem()
+        for other in recovered:     #only one game is resumed at a terminal
+            journal.endSession(other)
+        output = session.getOutput()
+        output.println("Resuming your last game.")
+        room = game.getRooms()[session.getCurrentRoom()]
+        game.handleLook(room, session)
+    else:
+        session = game.newSession()
+        output = session.getOutput()
+        room = game.startSession(session)
+        sid = journal.startSession(session)
+    journal.flush()
+    output.flush()
+    try:
+        while room is not None:
+            answer = input(PROMPT).strip().upper()
+            command, item = game.parseInput(answer)
+            if not command:
+                continue
+            room = game.processCommand(command, item, session)
+            journal.record(sid, session, command, item)
+            journal.flush()
+            output.flush()
+    finally:
+        journal.close()
+
+# Startup code
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play or inspect an Adventure game journal.")
+    parser.add_argument("prefix", help="world to load, such as Crowther or Small")
+    parser.add_argument("journal", help="journal file")
+    parser.add_argument("--list", action="store_true", help="list the games that can be recovered")
+    args = parser.parse_args()
+    game = AdvGame(args.prefix)
+    if args.list:
+        for sid, session in recover(game, args.journal).items():
+            print("%016x %s %s" % (sid, session.getCurrentRoom(), " ".join(session.getInventory())))
+    else:
+        runJournaled(game, args.journal)
@@ -4,12 +4,16 @@
 This module defines a class that models an object in Adventure.
 """
 
+import sys
+
 class AdvObject:
 
+    __slots__ = ("_name", "_description", "_location")
+
     def __init__(self, name, description, location):
-        self._name = name
+        self._name = sys.intern(name)
         self._description = description
-        self._location = location
+        self._location = sys.intern(location)
 
     def getName(self):
         return self._name
@@ -20,6 +24,9 @@ class AdvObject:
     def getInitialLocation(self):
         return self._location
 
+    def internDescription(self):     #shares the description with identical text in other worlds
+        self._description = sys.intern(self._description)
+
     @staticmethod
     def readObject(f):
 
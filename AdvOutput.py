@@ -0,0 +1,103 @@
+# File: AdvOutput.py
+
+"""
+This module defines the output sinks the game writes to.  A sink
+collects everything a command prints and sends it in one write when
+flush is called, so a long description costs one system call instead of
+one per line.
+"""
+
+import sys
+from abc import ABC, abstractmethod
+
+class OutputSink(ABC):
+
+    def __init__(self):
+        """Creates a sink with an empty buffer."""
+        self._parts = []
+
+    def write(self, text):      #adds text without a newline (used for prompts)
+        self._parts.append(text)
+
+    def println(self, line=""):      #adds one line of output
+        self._parts.append(line)
+        self._parts.append("\n")
+
+    def printLines(self, lines):     #adds a sequence of lines
+        for line in lines:
+            self._parts.append(line)
+            self._parts.append("\n")
+
+    def flush(self):     #sends the buffered text in a single write
+        if self._parts:
+            text = "".join(self._parts)
+            self._parts.clear()
+            self.emit(text)
+
+    @abstractmethod
+    def emit(self, text):    #writes a block of text to the destination
+        pass
+
+class TerminalSink(OutputSink):
+
+    def __init__(self, stream=None):
+        """Creates a sink that writes to a text stream (standard output by default)."""
+        super().__init__()
+        self._stream = stream
+
+    def emit(self, text):
+        stream = sys.stdout if self._stream is None else self._stream
+        stream.write(text)
+        stream.flush()
+
+class BufferSink(OutputSink):
+
+    def __init__(self):
+        """Creates a sink that keeps everything it is sent in memory."""
+        super().__init__()
+        self._emitted = []
+
+    def emit(self, text):
+        self._emitted.append(text)
+
+    def getValue(self):     #returns all text flushed so far
+        return "".join(self._emitted)
+
+    def take(self):     #returns the text flushed since the last take and forgets it
+        text = "".join(self._emitted)
+        self._emitted.clear()
+        return text
+
+class StreamSink(OutputSink):
+
+    def __init__(self, writer, encoding="utf-8"):
+        """Creates a sink that writes to an asyncio StreamWriter or a socket."""
+        super().__init__()
+        self._writer = writer
+        self._encoding = encoding
+
+    def emit(self, text):
+        data = text.encode(self._encoding)
+        if hasattr(self._writer, "sendall"):
+            self._writer.sendall(data)
+        else:
+            self._writer.write(data)
+
+class NullSink(OutputSink):
+
+    """A sink that discards all output, for benchmarks and replays."""
+
+    def write(self, text):
+        pass
+
+    def println(self, line=""):
+        pass
+
+    def printLines(self, lines):
+        pass
+
+    def flush(self):
+        pass
+
+    def emit(self, text):
+        pass
@@ -0,0 +1,93 @@
+# File: AdvReplay.py
+
+"""
+This module replays scripts of commands without a terminal.  Each line
+of a script is handled exactly as if it had been typed at the prompt,
+but output goes to a NullSink (or a BufferSink when a transcript is
+wanted), so a replay runs as fast as processCommand allows.  Many
+scripts can be replayed in parallel across a pool of processes, each of
+which loads the world once.
+"""
+
+import argparse
+import concurrent.futures
+import sys
+
+from AdvGame import AdvGame
+from AdvOutput import BufferSink, NullSink
+
+# Constants
+PROMPT = "> "
+
+def replay(game, commands, transcript=False):    #plays the commands and returns (session, transcript or None)
+    output = BufferSink() if transcript else NullSink()
+    session = game.newSession(output)
+    room = game.startSession(session)
+    for line in commands:
+        if room is None:
+            break
+        output.write(PROMPT)
+        command, item = game.parseInput(line.strip().upper())
+        if command:
+            room = game.processCommand(command, item, session)
+    output.flush()
+    return session, output.getValue() if transcript else None
+
+def summarize(session, commands):     #returns a picklable description of the final state
+    return {
+        "commands": commands,
+        "room": session.getCurrentRoom(),
+        "inventory": list(session.getInventory()),
+    }
+
+# Each worker process loads a world the first time a script needs it
+_games = {}
+
+def _getGame(prefix):
+    game = _games.get(prefix)
+    if game is None:
+        game = AdvGame(prefix)
+        _games[prefix] = game
+    return game
+
+def replayFile(prefix, path, transcript=False):    #replays a script file and returns its summary
+    with open(path) as f:
+        lines = f.readlines()
+    session, text = replay(_getGame(prefix), lines, transcript)
+    result = summarize(session, len(lines))
+    result["path"] = path
+    if transcript:
+        result["transcript"] = text
+    return result
+
+def replayMany(prefix, paths, jobs=None, transcript=False):     #replays script files across a process pool
+    if jobs == 1:
+        return [replayFile(prefix, path, transcript) for path in paths]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs,
+                                                initializer=_getGame, initargs=(prefix,)) as pool:
+        futures = [pool.submit(replayFile, prefix, path, transcript) for path in paths]
+        return [future.result() for future in futures]
+
+# Startup code
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay Adventure command scripts.")
+    parser.add_argument("prefix", help="world to load, such as Crowther or Small")
+    parser.add_argument("scripts", nargs="*", help="files of commands, one per line (default: standard input)")
+    parser.add_argument("--jobs", type=int, default=1, help="number of worker processes (0 for one per CPU)")
+    parser.add_argument("--transcript", action="store_true", help="print the output of each script")
+    args = parser.parse_args()
+    if args.scripts:
+        results = replayMany(args.prefix, args.scripts, args.jobs or None, args.transcript)
+    else:
+        lines = sys.stdin.readlines()
+        session, text = replay(AdvGame(args.prefix), lines, args.transcript)
+        results = [summarize(session, len(lines))]
+        results[0]["path"] = "<stdin>"
+        results[0]["transcript"] = text
+    for result in results:
+        if args.transcript:
+            sys.stdout.write(result["transcript"])
+        else:
+            print(result["path"] + ": " + str(result["commands"]) + " commands, ended in "
+                  + str(result["room"]) + ", carrying " + " ".join(result["inventory"]))
@@ -4,19 +4,34 @@
 This module is responsible for modeling a single room in Adventure.
 """
 
+import sys
+
 # Constants
 
 MARKER = "-----"
 
 class AdvRoom:
+
+    __slots__ = ("_name", "_shortdesc", "_longdesc", "_longtext", "_verbs", "_dests", "_keys",
+                 "_exits", "_forced", "_wildcard")
+
     def __init__(self, name, shortdesc, longdesc, passages):
         """Creates a new room with the specified attributes."""
-        self._name = name
+        intern = sys.intern
+        self._name = intern(name)
         self._shortdesc = shortdesc
-        self._longdesc = longdesc
-        self._passages = passages
-        self._visited = False
-        self._objects = []
+        self._longdesc = tuple(longdesc)
+        self._longtext = "".join(line + "\n" for line in self._longdesc)     #joined once, written in one piece
+        # passages are kept as parallel tuples of interned strings
+        self._verbs = tuple(intern(verb) for verb, _, _ in passages)
+        self._dests = tuple(None if dest is None else intern(dest) for _, dest, _ in passages)
+        self._keys = tuple(None if key is None else intern(key) for _, _, key in passages)
+        exits = {}      #verb -> indexes of its passages, in the order they were listed
+        for i, verb in enumerate(self._verbs):
+            exits[verb] = exits.get(verb, ()) + (i,)
+        self._exits = exits
+        self._forced = "FORCED" in exits
+        self._wildcard = "*" in exits
 
     def getName(self):
         """Returns the name of this room."""
@@ -27,33 +42,42 @@ class AdvRoom:
         return self._shortdesc
 
     def getLongDescription(self):
-        """Returns the list of lines describing this room."""
+        """Returns the sequence of lines describing this room."""
         return self._longdesc
 
+    def getLongText(self):
+        """Returns the long description as one block of text, each line ending in a newline."""
+        return self._longtext
+
     #removed getNextRoom method because it was redundant with getPassages and my decomposition within AdvGame
 
     def getPassages(self):
-        return self._passages #returns list of tuples
-
-    def setVisited(self, visited):    #sets a room if visited or not
-        self._visited = visited
-
-    def hasBeenVisited(self):       #determines if a room has been visited
-        return self._visited
+        return list(zip(self._verbs, self._dests, self._keys)) #returns list of tuples
 
-    def addObject(self, obj):       #adds object to room
-        self._objects.append(obj)
+    def getExits(self, verb):   #returns the (destination, key) pairs for a verb in the order they were listed
+        return tuple((self._dests[i], self._keys[i]) for i in self._exits.get(verb, ()))
 
-    def removeObject(self, obj):   #removes object from room
-        self._objects.remove(obj)
+    def findExit(self, verb, inventory):    #returns where verb leads given the objects carried, or None
+        keys = self._keys
+        for i in self._exits.get(verb, ()):
+            key = keys[i]
+            if key is None or key in inventory:
+                return self._dests[i]
+        return None
 
-    def containsObject(self, obj):     #checks if room contains object
-        return obj in self._objects
+    def isForced(self):     #checks if this room has a FORCED passage
+        return self._forced
 
-    def getContents(self):
-        return self._objects   # returns list of object contents
+    def hasWildcard(self):      #checks if this room has a * passage
+        return self._wildcard
 
+    def internDescriptions(self):     #shares the description text with identical text in other worlds
+        intern = sys.intern
+        self._shortdesc = intern(self._shortdesc)
+        self._longdesc = tuple(intern(line) for line in self._longdesc)     #shared by worlds that share only some lines
+        self._longtext = intern(self._longtext)
 
+    #visited flags and room contents are per-player state and live in AdvSession
 
     @staticmethod
     def readRoom(f):
@@ -0,0 +1,158 @@
+# File: AdvRoomIndex.py
+
+"""
+This module loads the rooms of very large worlds on demand.  The first
+time a rooms file is used, it is scanned once to record the byte offset
+at which each room starts, and that index is saved next to the file as
+prefix + "Rooms.idx" together with the passage verbs the rooms use.
+The index is written to a temporary file and renamed into place, and an
+index that is cut short is ignored.  Later starts read only the index,
+which is rebuilt whenever the size or modification time of the rooms file
+changes.  Rooms are parsed with AdvRoom.readRoom when they are first
+needed and kept in a least-recently-used cache of bounded size.
+"""
+
+import os
+import struct
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from AdvGame import AdvGame
+from AdvRoom import AdvRoom, MARKER
+import AdvFiles
+
+# Constants
+
+INDEX_SUFFIX = "Rooms.idx"
+MAGIC = b"ADVI"
+VERSION = 3
+HEADER = struct.Struct("<4sHHqQII")     #magic, version, unused, mtime, size, room count, verb count
+DEFAULT_CACHE_SIZE = 1024
+
+def scanRooms(path):   #returns (names, offsets, verbs) for the rooms in a rooms file
+    names = []
+    offsets = array("Q")
+    verbs = set()
+    marker = MARKER.encode()
+    with open(path, "rb") as f:
+        state = "name"
+        offset = 0
+        for line in f:
+            text = line.rstrip()
+            if state == "name":
+                if text == b"":     #readRoom stops at a blank name line
+                    break
+                names.append(text.decode("utf-8"))
+                offsets.append(offset)
+                state = "short"
+            elif state == "short":
+                state = "long"
+            elif state == "long":
+                if text == marker:
+                    state = "passages"
+            elif text == b"":
+                state = "name"
+            else:
+                verbs.add(text[:text.find(b":")].decode("utf-8").strip().upper())
+            offset += len(line)
+    return names, offsets, sorted(verbs)
+
+def writeIndex(path, stat, names, offsets, verbs):     #readers never see a partly written index
+    data = HEADER.pack(MAGIC, VERSION, 0, stat.st_mtime_ns, stat.st_size, len(names), len(verbs))
+    AdvFiles.writeAtomically(path, data + offsets.tobytes() + "".join(word + "\n" for word in names + verbs).encode("utf-8"))
+
+def readIndex(path, stat):     #returns (names, offsets, verbs) from a saved index, or None if it is missing or stale
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) < HEADER.size:
+        return None
+    magic, version, _, mtime, size, count, nverbs = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION or mtime != stat.st_mtime_ns or size != stat.st_size:
+        return None
+    offsets = array("Q")
+    end = HEADER.size + offsets.itemsize * count
+    if len(data) < end:
+        return None
+    offsets.frombytes(data[HEADER.size:end])
+    try:
+        words = data[end:].decode("utf-8").split("\n")     #every word ends in a newline, so the last piece is empty
+    except UnicodeDecodeError:      #cut short inside a name
+        return None
+    if words.pop() != "":
+        return None
+    if len(words) != count + nverbs:
+        return None
+    return words[:count], offsets, words[count:]
+
+def loadIndex(prefix):    #returns (names, offsets, verbs) for a world, rebuilding the saved index if needed
+    rooms_path = prefix + "Rooms.txt"
+    index_path = prefix + INDEX_SUFFIX
+    stat = os.stat(rooms_path)
+    index = readIndex(index_path, stat)
+    if index is None:
+        index = scanRooms(rooms_path)
+        try:
+            writeIndex(index_path, stat, *index)
+        except OSError:
+            pass        #an unwritable directory only costs a rescan next time
+    return index
+
+class LineReader:
+
+    def __init__(self, f):
+        """Wraps a binary file so AdvRoom.readRoom can read decoded lines from it."""
+        self._f = f
+
+    def readline(self):
+        return self._f.readline().decode("utf-8")
+
+class LazyRooms(Mapping):
+
+    def __init__(self, prefix, cache_size=DEFAULT_CACHE_SIZE):
+        """Creates a read-only room mapping that parses rooms when they are first used."""
+        self._path = prefix + "Rooms.txt"
+        self._names, self._offsets, self._verbs = loadIndex(prefix)
+        self._index = {name: i for i, name in enumerate(self._names)}
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._file = open(self._path, "rb")
+
+    def __getitem__(self, name):
+        room = self._cache.get(name)
+        if room is not None:
+            self._cache.move_to_end(name)
+            return room
+        index = self._index.get(name)
+        if index is None:
+            raise KeyError(name)
+        self._file.seek(self._offsets[index])
+        room = AdvRoom.readRoom(LineReader(self._file))
+        self._cache[name] = room
+        if len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+        return room
+
+    def __contains__(self, name):
+        return name in self._index
+
+    def __iter__(self):     #room names in file order, so the first one is the start room
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def getVerbs(self):     #returns every passage verb without parsing the rooms
+        return self._verbs
+
+    def getCachedCount(self):     #returns the number of rooms currently parsed and cached
+        return len(self._cache)
+
+    def close(self):
+        self._file.close()
+
+def loadGame(prefix, cache_size=DEFAULT_CACHE_SIZE):   #returns an AdvGame whose rooms are parsed on demand
+    return AdvGame(prefix, rooms=LazyRooms(prefix, cache_size), validate=False)
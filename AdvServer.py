@@ -0,0 +1,279 @@
+# File: AdvServer.py
+
+"""
+This module serves Adventure to many players at once over TCP or a Unix
+socket.  Every connection gets its own AdvSession, but all of them share
+one AdvGame and run in a single asyncio event loop.  Commands are short
+and never block, so each one is handled in full between reads, and the
+text it produces is collected by the session's StreamSink and sent to
+the player in one write.  With --journal, each command is journaled
+(see AdvJournal) and its output is only sent once the record is on disk.
+The unfinished games in the journal are recovered when the server
+starts, and each player is given a token; after a crash or a dropped
+connection, typing RESUME and the token continues that game.
+
+With --workers, the world is loaded once and the listening sockets are
+opened in a parent process, which then forks worker processes that each
+run their own event loop.  The workers inherit the world copy-on-write
+and accept connections from the same sockets, so the memory they add is
+mostly the state of their own sessions.  A journal belongs to one
+process, so --journal cannot be combined with --workers.
+"""
+
+import argparse
+import asyncio
+import contextlib
+from collections import OrderedDict
+import gc
+import os
+import signal
+import socket
+import stat
+import sys
+import threading
+
+from AdvGame import AdvGame
+from AdvOutput import NullSink, StreamSink
+import AdvJournal
+import AdvStats
+
+# Constants
+PROMPT = "> "
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 7000
+MAX_LINE = 1024
+BACKLOG = 1024
+RESUME_COMMAND = "RESUME"
+MAX_DETACHED = 4096     #games kept for players who may come back; the oldest are ended first
+
+class AdvServer:
+
+    def __init__(self, game, journal=None, detached=None):
+        """Creates a server that plays the given game, journaling commands if a Journal is given."""
+        self._game = game
+        self._journal = journal
+        self._sessions = 0
+        self._detached = OrderedDict(detached or {})    #session id -> journaled game nobody is playing
+
+    def getSessionCount(self):     #returns the number of players currently connected
+        return self._sessions
+
+    async def handleClient(self, reader, writer):     #plays one session until the player quits or disconnects
+        game = self._game
+        journal = self._journal
+        output = StreamSink(writer)
+        session = game.newSession(output)
+        self._sessions += 1
+        room = sid = None
+        try:
+            room = game.startSession(session)
+            if journal is not None:
+                sid = journal.startSession(session)
+                await journal.commit()
+                output.println(self.describeToken(sid))
+            output.write(PROMPT)
+            output.flush()
+            await writer.drain()
+            while room is not None:
+                try:
+                    line = await reader.readline()
+                except ValueError:      #line longer than the stream limit
+                    break
+                if not line:
+                    break
+                answer = line.decode("utf-8", "replace").strip().upper()
+                words = answer.split()
+                if journal is not None and len(words) == 2 and words[0] == RESUME_COMMAND:
+                    resumed = self.reattach(words[1], output)
+                    if resumed is None:
+                        output.println("There is no game to resume with that token.")
+                    else:
+                        journal.endSession(sid)
+                        sid, session = resumed
+                        room = game.getRooms()[session.getCurrentRoom()]
+                        journal.resumeSession(sid, session)
+                        await journal.commit()
+                        output.println(self.describeToken(sid))
+                        game.handleLook(room, session)
+                    output.write(PROMPT)
+                    output.flush()
+                    await writer.drain()
+                    continue
+                command, item = game.parseInput(answer)
+                if command:
+                    room = game.processCommand(command, item, session)
+                    if journal is not None:
+                        journal.record(sid, session, command, item)
+                        await journal.commit()      #shares one fsync with the other players
+                if room is not None:
+                    output.write(PROMPT)
+                output.flush()
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._sessions -= 1
+            if sid is not None and room is not None:
+                self.detach(sid, session)
+            writer.close()
+            with contextlib.suppress(ConnectionError):
+                await writer.wait_closed()
+
+    def describeToken(self, sid):
+        return "Your game token is %016X; type %s %016X to continue this game later." % (sid, RESUME_COMMAND, sid)
+
+    def detach(self, sid, session):     #keeps a game whose player went away so it can be resumed
+        session.setOutput(NullSink())
+        self._detached[sid] = session
+        while len(self._detached) > MAX_DETACHED:
+            old, _ = self._detached.popitem(last=False)
+            self._journal.endSession(old)
+
+    def reattach(self, token, output):     #returns (session id, session) for a detached game, or None
+        try:
+            sid = int(token, 16)
+        except ValueError:
+            return None
+        session = self._detached.pop(sid, None)
+        if session is None:
+            return None
+        session.setOutput(output)
+        return sid, session
+
+    async def serve(self, host=None, port=None, path=None):    #listens on TCP and/or a Unix socket until cancelled
+        await self.serveSockets(openListeners(host, port, path))
+
+    async def serveSockets(self, socks):    #accepts players on already listening sockets until cancelled
+        servers = []
+        for sock in socks:
+            if sock.family == socket.AF_INET or sock.family == socket.AF_INET6:
+                servers.append(await asyncio.start_server(self.handleClient, sock=sock, limit=MAX_LINE))
+            else:
+                servers.append(await asyncio.start_unix_server(self.handleClient, sock=sock, limit=MAX_LINE))
+        try:
+            await asyncio.gather(*(server.serve_forever() for server in servers))
+        finally:
+            for server in servers:
+                server.close()
+
+def openListeners(host=None, port=None, path=None):    #returns the listening sockets for a Unix path and/or a TCP port
+    socks = []
+    if path is not None:
+        with contextlib.suppress(FileNotFoundError):
+            if stat.S_ISSOCK(os.stat(path).st_mode):     #left behind by an earlier server
+                os.remove(path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        sock.listen(BACKLOG)
+        socks.append(sock)
+    if port is not None or path is None:
+        socks.append(socket.create_server((host or DEFAULT_HOST, DEFAULT_PORT if port is None else port),
+                                          backlog=BACKLOG))
+    return socks
+
+def serveWorkers(game, workers, host=None, port=None, path=None, stats=None):   #forks workers that share the game and the sockets
+    socks = openListeners(host, port, path)
+
+    # Everything a worker would otherwise build on first use is built here, so
+    # the shared world is only read after the fork.  Freezing the collector
+    # keeps it from writing to the pages of the shared objects when it runs.
+    game.numberWorld()
+    game.getVocabulary()
+    gc.collect()
+    gc.freeze()
+    pids = []
+    try:
+        for _ in range(workers):
+            pid = os.fork()
+            if pid == 0:
+                status = 0
+                try:
+                    if stats is not None:
+                        stats.installSignalHandler()    #each worker dumps its own copy
+                    asyncio.run(AdvServer(game).serveSockets(socks))
+                except KeyboardInterrupt:
+                    pass
+                except BaseException:
+                    sys.excepthook(*sys.exc_info())
+                    status = 1
+                finally:
+                    os._exit(status)
+            pids.append(pid)
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))     #stops the workers too
+        if stats is not None:
+            signal.signal(signal.SIGUSR1, lambda signum, frame: signalWorkers(pids, signum))
+        for pid in pids:
+            os.waitpid(pid, 0)
+    finally:
+        for pid in pids:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGTERM)
+        for pid in pids:
+            with contextlib.suppress(ChildProcessError):
+                os.waitpid(pid, 0)
+        for sock in socks:
+            sock.close()
+
+def signalWorkers(pids, signum):     #passes a signal the parent received on to every worker
+    for pid in pids:
+        with contextlib.suppress(ProcessLookupError):
+            os.kill(pid, signum)
+
+def runClient(host=None, port=None, path=None):    #a minimal terminal client for trying out a server
+    if path is not None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(path)
+    else:
+        sock = socket.create_connection((host or DEFAULT_HOST, DEFAULT_PORT if port is None else port))
+
+    def copyOutput():
+        while True:
+            data = sock.recv(4096)
+            if not data:
+                break
+            sys.stdout.write(data.decode("utf-8", "replace"))
+            sys.stdout.flush()
+
+    reader = threading.Thread(target=copyOutput)
+    reader.start()
+    try:
+        for line in sys.stdin:
+            sock.sendall(line.encode())
+    except (BrokenPipeError, KeyboardInterrupt):
+        pass
+    with contextlib.suppress(OSError):
+        sock.shutdown(socket.SHUT_WR)
+    reader.join()
+    sock.close()
+
+# Startup code
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve Adventure to many players.")
+    parser.add_argument("--prefix", default="Crowther", help="world to load (default Crowther)")
+    parser.add_argument("--host", help="TCP address to listen on (default " + DEFAULT_HOST + ")")
+    parser.add_argument("--port", type=int, help="TCP port (default " + str(DEFAULT_PORT) + ")")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=0, help="fork this many worker processes (default: serve in this one)")
+    parser.add_argument("--journal", metavar="PATH", help="journal every command to this file and resume its games")
+    parser.add_argument("--stats", action="store_true", help="collect timings, shown by STATS and dumped on SIGUSR1")
+    parser.add_argument("--connect", action="store_true", help="connect to a server as a client")
+    args = parser.parse_args()
+    if args.journal is not None and args.workers > 0:
+        parser.error("--journal cannot be combined with --workers")
+    if args.connect:
+        runClient(args.host, args.port, args.unix)
+    else:
+        game = AdvGame(args.prefix)
+        game.setSaveDirectory(None)     #saved games are not kept per player, so SAVE and RESTORE are off
+        journal = detached = None
+        if args.journal is not None:
+            journal, detached = AdvJournal.openJournal(game, args.journal)
+        stats = AdvStats.instrument(game) if args.stats else None
+        with contextlib.suppress(KeyboardInterrupt):
+            if args.workers > 0:
+                serveWorkers(game, args.workers, args.host, args.port, args.unix, stats)
+            else:
+                if stats is not None:
+                    stats.installSignalHandler()
+                asyncio.run(AdvServer(game, journal, detached).serve(args.host, args.port, args.unix))
@@ -0,0 +1,258 @@
+# File: AdvSession.py
+
+"""
+This module defines the AdvSession class, which records the state of a
+single player.  The rooms, passages and objects belong to the AdvGame
+and are shared by every session; a session only keeps what a player
+changes.
+
+Every object is also indexed by where it is, so finding an object or
+checking whether a room holds it does not search the rooms.  Like the
+contents, the index starts from the initial world and only records the
+objects that have moved.
+
+A session can be forked.  The branch and its parent then both read the
+visited flags, changed room contents and moved objects through the same
+frozen layers and record their own changes in new, empty dictionaries on
+top, so each side only stores the rooms and objects it touches.  After
+MAX_LAYERS nested forks the frozen layers are merged into one, which
+keeps lookups short.  The inventory holds at most the few objects the
+player carries and is copied whole the first time either side changes it.
+"""
+
+from AdvOutput import NullSink
+
+# Constants
+
+SHARED_INVENTORY = 1
+PLAYER = "PLAYER"       #the location of carried objects, as in the Objects file
+UNMOVED = object()      #marks an object that is still where the world put it
+MISSING = object()      #marks a key a layer says nothing about
+MAX_LAYERS = 16
+
+def freezeLayer(own, base, default):    #returns the frozen layers both sides of a fork read through
+    if not own:
+        return base
+    if base is not None and base[2] >= MAX_LAYERS:
+        merged = mergeLayers(base)
+        merged.update(own)
+        return {key: value for key, value in merged.items() if value is not default}, None, 0
+    return own, base, 0 if base is None else base[2] + 1
+
+def mergeLayers(base):     #returns one dictionary with the newest value each key has in a chain of layers
+    layers = []
+    while base is not None:
+        layers.append(base[0])
+        base = base[1]
+    merged = {}
+    for own in reversed(layers):
+        merged.update(own)
+    return merged
+
+def findInLayers(base, key, default):     #returns the newest value a chain of frozen layers has for key
+    while base is not None:
+        value = base[0].get(key, MISSING)
+        if value is not MISSING:
+            return value
+        base = base[1]
+    return default
+
+class AdvSession:
+
+    __slots__ = ("_room", "_visited", "_visited_base", "_initial", "_contents", "_contents_base",
+                 "_inventory", "_output", "_shared", "_initial_locations", "_locations",
+                 "_locations_base", "_rendered")
+
+    def __init__(self, start_room, initial_contents, initial_inventory, output, initial_locations=None):
+        """Creates a new session positioned in the start room."""
+        self._output = output
+        self._room = start_room
+        self._initial = initial_contents     #shared with the game, never modified
+        self._inventory = dict.fromkeys(initial_inventory)    #ordered like a list, checked like a set
+        if initial_locations is None:
+            initial_locations = {obj: name for name, objs in initial_contents.items() for obj in objs}
+            initial_locations.update(dict.fromkeys(initial_inventory, PLAYER))
+        self._initial_locations = initial_locations     #shared with the game, never modified
+        self.clearChanges()
+
+    def clearChanges(self):
+        # each of these records this session's own changes over frozen layers shared with
+        # forks (None if there are none); False, None and UNMOVED undo a change in a layer below
+        self._visited = {}                   #room -> visited
+        self._visited_base = None
+        self._contents = {}                  #room -> contents, or None for its initial contents
+        self._contents_base = None
+        self._locations = {}                 #object -> room, PLAYER, None if nowhere, or UNMOVED
+        self._locations_base = None
+        self._shared = 0                     #SHARED_INVENTORY if a fork may also be using the inventory
+        self._rendered = {}                  #changed room -> text listing its contents, dropped when they change
+
+    def reset(self, start_room, initial_inventory):     #returns the player to the state of a new session
+        self._room = start_room
+        self._inventory = dict.fromkeys(initial_inventory)
+        self.clearChanges()
+
+    def takeState(self, other):     #replaces this session's state with that of another, which must not be used again
+        for name in AdvSession.__slots__:
+            if name != "_output":
+                setattr(self, name, getattr(other, name))
+
+    def fork(self, output=None):    #returns a branch of this session; output defaults to a NullSink
+        branch = AdvSession.__new__(AdvSession)
+        branch._output = NullSink() if output is None else output
+        branch._room = self._room
+        branch._initial = self._initial
+        branch._initial_locations = self._initial_locations
+        branch._inventory = self._inventory
+        branch._visited_base = self._visited_base = freezeLayer(self._visited, self._visited_base, False)
+        branch._contents_base = self._contents_base = freezeLayer(self._contents, self._contents_base, None)
+        branch._locations_base = self._locations_base = freezeLayer(self._locations, self._locations_base, UNMOVED)
+        branch._visited, self._visited = {}, {}
+        branch._contents, self._contents = {}, {}
+        branch._locations, self._locations = {}, {}
+        branch._shared = self._shared = SHARED_INVENTORY
+        branch._rendered = {}
+        return branch
+
+    def getOutput(self):       #returns the sink this player's output is written to
+        return self._output
+
+    def setOutput(self, output):
+        self._output = output
+
+    def getCurrentRoom(self):       #returns the name of the room the player is in (None once the game is over)
+        return self._room
+
+    def setCurrentRoom(self, room_name):
+        self._room = room_name
+
+    def setVisited(self, room_name, visited):    #sets a room if visited or not
+        if self.hasBeenVisited(room_name) == visited:
+            return
+        if visited:
+            self._visited[room_name] = True
+        elif self._visited_base is None:
+            del self._visited[room_name]
+        else:
+            self._visited[room_name] = False
+
+    def hasBeenVisited(self, room_name):       #determines if a room has been visited
+        visited = self._visited.get(room_name)
+        if visited is None:
+            base = self._visited_base
+            return base is not None and findInLayers(base, room_name, False)
+        return visited
+
+    def getVisitedRooms(self):      #returns the set of names of the rooms visited so far
+        visited = self._visited
+        if self._visited_base is not None:
+            visited = mergeLayers(self._visited_base)
+            visited.update(self._visited)
+        return {name for name, flag in visited.items() if flag}
+
+    def addObject(self, room_name, obj):       #adds object to room
+        self.replaceContents(room_name, self.getContents(room_name) + (obj,))
+        self.setLocation(obj, room_name)
+
+    def removeObject(self, room_name, obj):   #removes object from room
+        contents = list(self.getContents(room_name))
+        contents.remove(obj)
+        self.replaceContents(room_name, tuple(contents))
+        if self.getLocation(obj) == room_name:
+            self.setLocation(obj, None)
+
+    def setContents(self, room_name, contents):     #replaces the contents of a room
+        for obj in self.getContents(room_name):
+            if obj not in contents and self.getLocation(obj) == room_name:
+                self.setLocation(obj, None)
+        self.replaceContents(room_name, contents)
+        for obj in contents:
+            self.setLocation(obj, room_name)
+
+    def replaceContents(self, room_name, contents):     #stores new contents without updating the object index
+        self._rendered.pop(room_name, None)
+        if contents == self._initial.get(room_name, ()):
+            if self._contents_base is None:
+                self._contents.pop(room_name, None)
+            else:
+                self._contents[room_name] = None
+        else:
+            self._contents[room_name] = contents
+
+    def getLocation(self, obj):     #returns the room an object is in, PLAYER if carried, or None
+        location = self._locations.get(obj, MISSING)
+        if location is MISSING:
+            base = self._locations_base
+            location = UNMOVED if base is None else findInLayers(base, obj, UNMOVED)
+        if location is UNMOVED:
+            location = self._initial_locations.get(obj)
+        return location
+
+    def setLocation(self, obj, location):
+        if location == self._initial_locations.get(obj):
+            if self._locations_base is None:
+                self._locations.pop(obj, None)
+            else:
+                self._locations[obj] = UNMOVED
+        else:
+            self._locations[obj] = location
+
+    def getChangedRooms(self):      #returns {room name: contents} for the rooms that differ from the initial world
+        if self._contents_base is None:
+            return self._contents
+        contents = mergeLayers(self._contents_base)
+        contents.update(self._contents)
+        return {name: objs for name, objs in contents.items() if objs is not None}
+
+    def getChangedContents(self, room_name):     #returns the contents of a room if they differ from the initial world, or None
+        contents = self._contents.get(room_name, MISSING)
+        if contents is MISSING:
+            base = self._contents_base
+            return None if base is None else findInLayers(base, room_name, None)
+        return contents
+
+    def containsObject(self, room_name, obj):     #checks if room contains object
+        return self.getLocation(obj) == room_name
+
+    def getContentsText(self, room_name):     #returns the cached text listing a changed room's contents, or None
+        return self._rendered.get(room_name)
+
+    def setContentsText(self, room_name, text):
+        self._rendered[room_name] = text
+
+    def getContents(self, room_name):     # returns tuple of object contents
+        contents = self.getChangedContents(room_name)
+        if contents is None:
+            contents = self._initial.get(room_name, ())
+        return contents
+
+    def getInventory(self):
+        return self._inventory   # returns the objects the player is carrying, in the order they were taken
+
+    def isCarrying(self, obj):
+        return obj in self._inventory
+
+    def addToInventory(self, obj):
+        self.ownInventory()
+        self._inventory[obj] = None
+        self.setLocation(obj, PLAYER)
+
+    def removeFromInventory(self, obj):
+        self.ownInventory()
+        del self._inventory[obj]
+        if self.getLocation(obj) == PLAYER:
+            self.setLocation(obj, None)
+
+    def setInventory(self, objs):
+        for obj in self._inventory:
+            if obj not in objs and self.getLocation(obj) == PLAYER:
+                self.setLocation(obj, None)
+        self._inventory = dict.fromkeys(objs)
+        self._shared &= ~SHARED_INVENTORY
+        for obj in objs:
+            self.setLocation(obj, PLAYER)
+
+    def ownInventory(self):     #copies the inventory if a fork is still sharing it
+        if self._shared & SHARED_INVENTORY:
+            self._inventory = dict(self._inventory)
+            self._shared &= ~SHARED_INVENTORY
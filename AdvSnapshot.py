@@ -0,0 +1,210 @@
+# File: AdvSnapshot.py
+
+"""
+This module saves and restores the state of an AdvSession.  A snapshot
+only records what differs from the initial world set up by
+assignObjects: the current room, the rooms visited, the rooms whose
+contents changed and the inventory.  Rooms and objects are written as
+their numbers in the world (see AdvGame.getRoomIndex) using variable
+length integers, so a snapshot is usually a few dozen bytes.
+
+A snapshot file is a sequence of records, each protected by a CRC-32.
+The first record holds a full state; a Checkpointer then appends delta
+records holding only what changed since the previous checkpoint.
+Reading stops at the first damaged or incomplete record, so a file cut
+short by a crash restores to its last complete checkpoint.
+"""
+
+import os
+import struct
+import zlib
+
+from AdvOutput import NullSink
+import AdvFiles
+
+# Constants
+MAGIC = b"ADVS"
+VERSION = 1
+FULL = 0
+DELTA = 1
+RECORD = struct.Struct("<4sBBII")     #magic, version, kind, world id, payload length
+CHECKSUM = struct.Struct("<I")
+NO_ROOM = 0
+
+class SnapshotError(Exception):
+    pass
+
+# Variable-length integers (seven bits per byte, low bits first)
+
+def writeVarint(buf, n):
+    while n >= 0x80:
+        buf.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+def readVarint(data, pos):     #returns (value, next position)
+    n = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+def writeNumbers(buf, numbers):    #writes a count followed by the sorted numbers as gaps
+    numbers = sorted(numbers)
+    writeVarint(buf, len(numbers))
+    last = 0
+    for n in numbers:
+        writeVarint(buf, n - last)
+        last = n
+
+def readNumbers(data, pos):    #returns (list of numbers, next position)
+    count, pos = readVarint(data, pos)
+    numbers = []
+    last = 0
+    for _ in range(count):
+        gap, pos = readVarint(data, pos)
+        last += gap
+        numbers.append(last)
+    return numbers, pos
+
+def writeObjects(buf, game, objs):     #writes a count followed by object numbers, keeping their order
+    writeVarint(buf, len(objs))
+    for obj in objs:
+        writeVarint(buf, game.getObjectIndex(obj))
+
+def readObjects(data, pos, game):
+    count, pos = readVarint(data, pos)
+    objs = []
+    for _ in range(count):
+        index, pos = readVarint(data, pos)
+        objs.append(game.getObjectNameAt(index))
+    return tuple(objs), pos
+
+# Records
+
+def frameRecord(header, payload):    #returns a record: the packed header, the payload and a CRC-32 of both
+    return header + payload + CHECKSUM.pack(zlib.crc32(payload, zlib.crc32(header)))
+
+def readFrames(data, header, magic, version):    #yields (header fields, payload) up to the first damaged record
+    # header is a struct whose first fields are the magic and version and whose last is the payload length
+    pos = 0
+    while pos + header.size <= len(data):
+        fields = header.unpack_from(data, pos)
+        end = pos + header.size + fields[-1]
+        if fields[0] != magic or fields[1] != version or end + CHECKSUM.size > len(data):
+            break
+        payload = bytes(data[pos + header.size:end])
+        if CHECKSUM.unpack_from(data, end)[0] != zlib.crc32(payload, zlib.crc32(data[pos:pos + header.size])):
+            break
+        yield fields, payload
+        pos = end + CHECKSUM.size
+
+def encodeRecord(game, kind, payload):
+    return frameRecord(RECORD.pack(MAGIC, VERSION, kind, game.getWorldId(), len(payload)), payload)
+
+def encodeState(game, room, visited, contents, inventory, unvisited=()):   #returns the payload shared by both record kinds
+    buf = bytearray()
+    writeVarint(buf, NO_ROOM if room is None else game.getRoomIndex(room) + 1)
+    writeNumbers(buf, [game.getRoomIndex(name) for name in visited])
+    writeNumbers(buf, [game.getRoomIndex(name) for name in unvisited])
+    writeVarint(buf, len(contents))
+    for name in sorted(contents, key=game.getRoomIndex):
+        writeVarint(buf, game.getRoomIndex(name))
+        writeObjects(buf, game, contents[name])
+    writeObjects(buf, game, inventory)
+    return bytes(buf)
+
+def applyState(game, session, payload):    #applies a payload to a session
+    room, pos = readVarint(payload, 0)
+    visited, pos = readNumbers(payload, pos)
+    unvisited, pos = readNumbers(payload, pos)
+    session.setCurrentRoom(None if room == NO_ROOM else game.getRoomNameAt(room - 1))
+    for index in visited:
+        session.setVisited(game.getRoomNameAt(index), True)
+    for index in unvisited:
+        session.setVisited(game.getRoomNameAt(index), False)
+    count, pos = readVarint(payload, pos)
+    for _ in range(count):
+        index, pos = readVarint(payload, pos)
+        objs, pos = readObjects(payload, pos, game)
+        session.setContents(game.getRoomNameAt(index), objs)
+    inventory, pos = readObjects(payload, pos, game)
+    session.setInventory(inventory)
+    if pos != len(payload):
+        raise SnapshotError("Unexpected data at the end of a snapshot")
+
+def encodeSnapshot(game, session):     #returns a full snapshot of a session
+    payload = encodeState(game, session.getCurrentRoom(), session.getVisitedRooms(),
+                          session.getChangedRooms(), session.getInventory())
+    return encodeRecord(game, FULL, payload)
+
+def readRecords(game, data):    #returns the (kind, payload) records up to the first damaged one
+    records = []
+    for (_, _, kind, world, _), payload in readFrames(data, RECORD, MAGIC, VERSION):
+        if world != game.getWorldId():
+            raise SnapshotError("Snapshot is for a different world")
+        records.append((kind, payload))
+    return records
+
+def restoreSnapshot(game, data, session=None, output=None):    #restores snapshot data into session (or a new one) and returns it
+    records = readRecords(game, data)
+    if not records or records[0][0] != FULL:
+        raise SnapshotError("No complete snapshot found")
+    restored = game.newSession(NullSink() if session is not None else output)
+    try:
+        for kind, payload in records:
+            if kind == FULL:
+                game.resetSession(restored)
+            applyState(game, restored, payload)
+    except IndexError:      #a number outside the world, or a payload cut short
+        raise SnapshotError("Snapshot does not fit this world") from None
+    if session is None:
+        return restored
+    session.takeState(restored)     #the session is only changed once the whole snapshot has applied
+    return session
+
+def saveSession(game, session, path):     #writes a full snapshot to a file; a crash keeps the previous one
+    AdvFiles.writeAtomically(path, encodeSnapshot(game, session))
+
+def loadSession(game, path, session=None, output=None):   #restores a snapshot or checkpoint file
+    with open(path, "rb") as f:
+        return restoreSnapshot(game, f.read(), session, output)
+
+class Checkpointer:
+
+    def __init__(self, game, session, path):
+        """Creates a checkpointer that appends the state of session to path."""
+        self._game = game
+        self._session = session
+        self._path = path
+        self._saved = None      #(room, visited, contents, inventory) at the last checkpoint
+
+    def checkpoint(self):    #appends a full record the first time, then only what changed
+        game = self._game
+        session = self._session
+        room = session.getCurrentRoom()
+        visited = frozenset(session.getVisitedRooms())
+        contents = dict(session.getChangedRooms())
+        inventory = tuple(session.getInventory())
+        if self._saved is None:
+            record = encodeRecord(game, FULL, encodeState(game, room, visited, contents, inventory))
+            mode = "wb"
+        else:
+            old_room, old_visited, old_contents, old_inventory = self._saved
+            changed = {name: objs for name, objs in contents.items() if old_contents.get(name) != objs}
+            for name in old_contents:
+                if name not in contents:
+                    changed[name] = session.getContents(name)
+            record = encodeRecord(game, DELTA, encodeState(game, room, visited - old_visited, changed,
+                                                           inventory, old_visited - visited))
+            mode = "ab"
+        with open(self._path, mode) as f:
+            f.write(record)
+            f.flush()
+            os.fsync(f.fileno())
+        self._saved = (room, visited, contents, inventory)
+        return len(record)
@@ -0,0 +1,156 @@
+# File: AdvSolver.py
+
+"""
+This module answers questions about the passage graph of a world:
+which rooms can be reached while carrying a given set of objects, the
+shortest list of commands from one room to another, and which rooms
+can never be reached or never be left.
+
+The graph is indexed once when the solver is created.  A move follows
+the same rules as AdvGame.handleMovement: the first passage for the
+verb whose key is carried wins, * passages are taken with the command
+"*", and FORCED passages are followed until the player comes to rest.
+Objects never change hands while moving, so every search is memoized
+on its start room and the set of carried objects that are keys
+anywhere in the world.
+"""
+
+import argparse
+from collections import deque
+
+from AdvGame import AdvGame
+
+# Constants
+MAX_CACHED_SEARCHES = 4096
+
+class AdvSolver:
+
+    def __init__(self, game):
+        """Indexes the passages of every room in the game."""
+        self._game = game
+        self._rooms = game.getRooms()
+        self._moves = {}        #room name -> ((verb, exits), ...) for the verbs a player can type
+        self._forced = set()
+        keys = set()
+        for name in self._rooms:
+            room = self._rooms[name]
+            if room.isForced():
+                self._forced.add(name)
+            moves = []
+            for verb, _, key in room.getPassages():
+                if key is not None:
+                    keys.add(key)
+                if verb != "FORCED" and all(verb != seen for seen, _ in moves):
+                    moves.append((verb, room.getExits(verb)))
+            self._moves[name] = tuple(moves)
+        self._keys = frozenset(keys)
+        self._searches = {}
+        self._settled = {}
+
+    def relevantKeys(self, inventory):      #returns the carried objects that open some passage
+        return self._keys.intersection(inventory)
+
+    def settle(self, room_name, keys):   #follows FORCED passages; returns (resting room or None, forced rooms passed)
+        cache_key = (room_name, keys)
+        result = self._settled.get(cache_key)
+        if result is None:
+            passed = []
+            name = room_name
+            while True:
+                if name not in self._forced:
+                    result = (name if name in self._rooms else None, tuple(passed))
+                    break
+                if name in passed:      #a FORCED cycle never comes to rest
+                    result = (None, tuple(passed))
+                    break
+                passed.append(name)
+                name = self._rooms[name].findExit("FORCED", keys)
+            self._settled[cache_key] = result
+        return result
+
+    def getMoves(self, room_name, keys):    #returns (command, resting room or None, forced rooms passed) for each verb
+        moves = []
+        for verb, exits in self._moves.get(room_name, ()):
+            for dest, key in exits:
+                if key is None or key in keys:
+                    moves.append((verb,) + self.settle(dest, keys))
+                    break
+        return moves
+
+    def search(self, start, inventory=None):   #returns ({room: (previous room, command)}, {forced room: (room, command)})
+        keys = self.relevantKeys(self._game.getInitialInventory() if inventory is None else inventory)
+        cache_key = (start, keys)
+        result = self._searches.get(cache_key)
+        if result is None:
+            tree = {start: None}
+            passed = {}
+            queue = deque([start])
+            while queue:
+                name = queue.popleft()
+                for verb, dest, forced in self.getMoves(name, keys):
+                    for forced_name in forced:
+                        if forced_name not in passed:
+                            passed[forced_name] = (name, verb)
+                    if dest is not None and dest not in tree:
+                        tree[dest] = (name, verb)
+                        queue.append(dest)
+            if len(self._searches) >= MAX_CACHED_SEARCHES:
+                self._searches.clear()
+            result = (tree, passed)
+            self._searches[cache_key] = result
+        return result
+
+    def canReach(self, start, goal, inventory=None):     #checks if goal can be entered from start
+        tree, passed = self.search(start, inventory)
+        return goal in tree or goal in passed
+
+    def shortestPath(self, start, goal, inventory=None):    #returns the shortest list of commands from start to goal, or None
+        tree, passed = self.search(start, inventory)
+        commands = []
+        if goal in tree:
+            step = tree[goal]
+        elif goal in passed:
+            step = passed[goal]
+        else:
+            return None
+        while step is not None:
+            name, verb = step
+            commands.append(verb)
+            step = tree[name]
+        commands.reverse()
+        return commands
+
+    def unreachableRooms(self, start=None, inventory=None):    #returns the rooms that can never be entered from start
+        if start is None:
+            start = self._game.getStartRoom()
+        tree, passed = self.search(start, inventory)
+        return [name for name in self._moves if name not in tree and name not in passed]
+
+    def deadEnds(self, inventory=None):    #returns the rooms a player can rest in but never leave
+        keys = self.relevantKeys(self._game.getInitialInventory() if inventory is None else inventory)
+        ends = []
+        for name in self._moves:
+            if name not in self._forced:
+                if all(dest is None or dest == name for _, dest, _ in self.getMoves(name, keys)):
+                    ends.append(name)
+        return ends
+
+    def hint(self, session, goal):    #returns the next command that moves a player toward goal, or None
+        path = self.shortestPath(session.getCurrentRoom(), goal, session.getInventory())
+        return path[0] if path else None
+
+# Startup code
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyze the passage graph of an Adventure world.")
+    parser.add_argument("prefix", help="world to load, such as Crowther or Small")
+    parser.add_argument("--carrying", nargs="*", help="objects carried (default: the starting inventory)")
+    parser.add_argument("--path", nargs=2, metavar=("FROM", "TO"), help="print the shortest commands between rooms")
+    args = parser.parse_args()
+    solver = AdvSolver(AdvGame(args.prefix))
+    if args.path:
+        path = solver.shortestPath(args.path[0], args.path[1], args.carrying)
+        print("No way there" if path is None else " ".join(path))
+    else:
+        print("Unreachable: " + " ".join(solver.unreachableRooms(inventory=args.carrying)))
+        print("Dead ends: " + " ".join(solver.deadEnds(args.carrying)))
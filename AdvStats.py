@@ -0,0 +1,208 @@
+# File: AdvStats.py
+
+"""
+This module measures where a game spends its time.  Calling
+instrument(game) replaces parseInput, processCommand, handleMovement,
+moveToRoom and followForcedChain on that one AdvGame object with timed
+wrappers, and times the emit method of the output sink of every session
+it creates afterwards.  A game that is never instrumented runs exactly
+the code it ran before, so the hooks cost nothing until they are used.
+
+Latencies are kept in histograms with one bucket per power of two
+nanoseconds, and commands are counted per verb.  An instrumented game
+answers the STATS command with a table of the numbers, and they can also
+be written as JSON or dumped to standard error on a signal.
+"""
+
+import json
+import os
+import signal
+import sys
+import time
+
+# Constants
+STATS_COMMAND = "STATS"
+BUCKETS = 64
+MAX_VERBS = 256         #verbs seen after this many are counted together as OTHER
+OTHER_VERB = "OTHER"
+
+class Histogram:
+
+    __slots__ = ("_unit", "_count", "_total", "_max", "_buckets")
+
+    def __init__(self, unit="ns"):
+        """Creates an empty histogram of values measured in the given unit."""
+        self._unit = unit
+        self._count = 0
+        self._total = 0
+        self._max = 0
+        self._buckets = [0] * BUCKETS
+
+    def record(self, value):     #adds one value; bucket i holds values below 2 ** i
+        self._count += 1
+        self._total += value
+        if value > self._max:
+            self._max = value
+        self._buckets[min(value.bit_length(), BUCKETS - 1)] += 1
+
+    def getCount(self):
+        return self._count
+
+    def getUnit(self):
+        return self._unit
+
+    def getMean(self):
+        return self._total / self._count if self._count else 0
+
+    def getMax(self):
+        return self._max
+
+    def percentile(self, p):     #returns an upper bound for the p-th percentile
+        rank = self._count * p / 100
+        seen = 0
+        for i, n in enumerate(self._buckets):
+            seen += n
+            if n and seen >= rank:
+                return min((1 << i) - 1, self._max)
+        return self._max
+
+    def toDict(self):
+        return {"unit": self._unit, "count": self._count, "mean": self.getMean(),
+                "p50": self.percentile(50), "p99": self.percentile(99), "max": self._max,
+                "buckets": {str((1 << i) - 1): n for i, n in enumerate(self._buckets) if n}}
+
+class AdvStats:
+
+    def __init__(self):
+        """Creates an empty set of counters and histograms."""
+        self._started = time.time()
+        self._counters = {}
+        self._histograms = {}
+        self._verbs = set()
+
+    def count(self, name, n=1):
+        self._counters[name] = self._counters.get(name, 0) + n
+
+    def record(self, name, value, unit="ns"):     #adds a value to the named histogram
+        histogram = self._histograms.get(name)
+        if histogram is None:
+            histogram = self._histograms[name] = Histogram(unit)
+        histogram.record(value)
+
+    def getVerb(self, command):     #returns the name commands are counted under, limiting how many there are
+        if command not in self._verbs:
+            if len(self._verbs) >= MAX_VERBS:
+                return OTHER_VERB
+            self._verbs.add(command)
+        return command
+
+    def getCounter(self, name):
+        return self._counters.get(name, 0)
+
+    def getHistogram(self, name):    #returns the named histogram or None
+        return self._histograms.get(name)
+
+    def toDict(self):
+        return {"pid": os.getpid(), "started": self._started, "uptime": time.time() - self._started,
+                "counters": dict(sorted(self._counters.items())),
+                "histograms": {name: self._histograms[name].toDict() for name in sorted(self._histograms)}}
+
+    def toJSON(self):
+        return json.dumps(self.toDict(), indent=2)
+
+    def writeJSON(self, path):
+        with open(path, "w") as f:
+            f.write(self.toJSON() + "\n")
+
+    def report(self):      #returns the statistics as lines of text
+        lines = ["%-24s %8s %10s %10s %10s %10s" % ("", "count", "mean", "p50", "p99", "max")]
+        for name in sorted(self._histograms):
+            h = self._histograms[name]
+            if h.getUnit() == "ns":     #shown in microseconds
+                values = (h.getMean() / 1000, h.percentile(50) / 1000, h.percentile(99) / 1000, h.getMax() / 1000)
+                unit = " us"
+            else:
+                values = (h.getMean(), h.percentile(50), h.percentile(99), h.getMax())
+                unit = " " + h.getUnit()
+            lines.append("%-24s %8d %10.1f %10.1f %10.1f %10.1f" % ((name, h.getCount()) + values) + unit)
+        for name in sorted(self._counters):
+            lines.append("%-24s %8d" % (name, self._counters[name]))
+        return lines
+
+    def installSignalHandler(self, signum=None, stream=None):   #dumps the statistics as JSON whenever the signal arrives
+        if signum is None:
+            signum = signal.SIGUSR1
+
+        def dump(signum, frame):
+            out = sys.stderr if stream is None else stream
+            out.write(self.toJSON() + "\n")
+            out.flush()
+
+        signal.signal(signum, dump)
+
+def instrument(game, stats=None):    #starts collecting statistics for a game and returns the AdvStats
+    if stats is None:
+        stats = AdvStats()
+    clock = time.perf_counter_ns
+    parse = game.parseInput
+    process = game.processCommand
+    movement = game.handleMovement
+    move = game.moveToRoom
+    follow = game.followForcedChain
+    new_session = game.newSession
+
+    def parseInput(answer):
+        start = clock()
+        result = parse(answer)
+        stats.record("parseInput", clock() - start)
+        return result
+
+    def processCommand(command, item, session):
+        if command == STATS_COMMAND:
+            session.getOutput().printLines(stats.report())
+            return game.getRooms()[session.getCurrentRoom()]
+        start = clock()
+        room = process(command, item, session)
+        stats.record("command " + stats.getVerb(command), clock() - start)
+        return room
+
+    def handleMovement(command, room, session):
+        start = clock()
+        result = movement(command, room, session)
+        stats.record("handleMovement", clock() - start)
+        return result
+
+    def moveToRoom(room_name, session, force_long_desc=False, from_forced=False):
+        start = clock()
+        result = move(room_name, session, force_long_desc, from_forced)
+        stats.record("moveToRoom", clock() - start)
+        return result
+
+    def followForcedChain(room_name, inventory):
+        passed, final = follow(room_name, inventory)
+        stats.record("forced chain depth", len(passed), "rooms")
+        return passed, final
+
+    def newSession(output=None):
+        session = new_session(output)
+        sink = session.getOutput()
+        emit = sink.emit
+
+        def timedEmit(text):
+            start = clock()
+            emit(text)
+            stats.record("emit", clock() - start)
+            stats.count("characters emitted", len(text))
+
+        sink.emit = timedEmit
+        stats.count("sessions")
+        return session
+
+    # instance attributes hide the class methods, so the game's own calls go through the wrappers
+    game.parseInput = parseInput
+    game.processCommand = processCommand
+    game.handleMovement = handleMovement
+    game.moveToRoom = moveToRoom
+    game.followForcedChain = followForcedChain
+    game.newSession = newSession
+    return stats
@@ -0,0 +1,86 @@
+# File: AdvVocabulary.py
+
+"""
+This module defines the AdvVocabulary class, which holds every word a
+game understands: the built-in commands, the verbs used by passages in
+any room, the object names and the synonyms.  It turns what a player
+typed into the word the rest of the game uses.
+
+A word is found by an exact lookup first, so synonyms behave exactly as
+they always have.  Otherwise a word of at least MIN_ABBREVIATION letters
+stands for the one verb (or object) it begins, and, as in the original
+game, only the first TRUNCATION letters of a longer word are significant.
+Abbreviations are looked up by binary search in sorted lists of
+spellings, which keeps the index small even for very large worlds.
+"""
+
+from bisect import bisect_left
+
+# Constants
+MIN_ABBREVIATION = 3
+TRUNCATION = 5
+
+class AdvVocabulary:
+
+    def __init__(self, verbs, objects, synonyms):
+        """Creates the vocabulary from canonical verbs, object names and a synonym dictionary."""
+        self._verbs = frozenset(verbs)
+        self._objects = frozenset(objects)
+        self._synonyms = synonyms
+        verb_spellings = {verb: verb for verb in self._verbs}
+        object_spellings = {name: name for name in self._objects}
+        for word, replacement in synonyms.items():
+            if replacement in self._verbs:
+                verb_spellings.setdefault(word, replacement)
+            elif replacement in self._objects:
+                object_spellings.setdefault(word, replacement)
+        self._verb_index = self.sortSpellings(verb_spellings)
+        self._object_index = self.sortSpellings(object_spellings)
+
+    @staticmethod
+    def sortSpellings(spellings):     #returns (sorted spellings, the word each one stands for)
+        names = sorted(spellings)
+        return names, [spellings[name] for name in names]
+
+    def getKey(self):       #returns a value that is equal for vocabularies of the same words
+        return self._verbs, self._objects, frozenset(self._synonyms.items())
+
+    def isVerb(self, word):     #checks if some command or passage uses word
+        return word in self._verbs
+
+    def isObject(self, word):
+        return word in self._objects
+
+    def resolveCommand(self, token):    #returns the verb a typed word stands for (the word itself if none)
+        return self.resolve(token, self._verbs, self._verb_index)
+
+    def resolveItem(self, token):    #returns the object a typed word stands for (the word itself if none)
+        return self.resolve(token, self._objects, self._object_index)
+
+    def resolve(self, token, words, index):
+        word = self._synonyms.get(token, token)
+        if word != token or word in words:
+            return word
+        if len(token) >= MIN_ABBREVIATION:
+            word = self.findAbbreviation(token, index)
+            if word is None and len(token) > TRUNCATION:
+                short = token[:TRUNCATION]
+                word = self._synonyms.get(short, short)
+                if word == short and word not in words:
+                    word = self.findAbbreviation(short, index)
+            if word is not None:
+                return word
+        return token
+
+    @staticmethod
+    def findAbbreviation(prefix, index):    #returns the one word whose spellings begin with prefix, or None
+        names, words = index
+        i = bisect_left(names, prefix)
+        found = None
+        while i < len(names) and names[i].startswith(prefix):
+            if found is None:
+                found = words[i]
+            elif words[i] != found:
+                return None     #ambiguous
+            i += 1
+        return found
@@ -0,0 +1,158 @@
+# File: AdvWorlds.py
+
+"""
+This module defines the AdvWorlds class, a registry of the worlds one
+process can play.  A world is loaded the first time it is asked for,
+and its description text and words are interned, so worlds built from
+the same data files (or sharing rooms copied from each other) keep one
+copy of each string.  Worlds whose vocabularies are equal share a single
+AdvVocabulary.
+
+The registry estimates how much memory each world takes.  When the total
+goes over the budget, the worlds used least recently are dropped, except
+ones that still have players in them and the one asked for last.
+
+Every RELOAD_CHECK_INTERVAL seconds a world is used, the modification
+times and sizes of its text files are checked.  If they changed, the
+world is loaded again into a new AdvGame.  Players already in the old
+game keep it until they finish, and it is still counted against the
+budget until then; only new sessions get the new one.  If the changed
+files cannot be loaded (for instance while they are half edited), the
+old game stays in use and loading is tried again at the next check.
+"""
+
+import os
+import sys
+import time
+import weakref
+from collections import OrderedDict
+
+from AdvCompile import SOURCE_SUFFIXES
+from AdvGame import AdvGame
+
+# Constants
+RELOAD_CHECK_INTERVAL = 1.0      #seconds between checks of a world's files
+
+class AdvWorlds:
+
+    def __init__(self, memory_budget=None, loader=None, check_interval=RELOAD_CHECK_INTERVAL):
+        """Creates an empty registry; loader(prefix) returns a new AdvGame (default AdvGame)."""
+        self._memory_budget = memory_budget     #bytes, or None for no limit
+        self._loader = AdvGame if loader is None else loader
+        self._check_interval = check_interval
+        self._worlds = OrderedDict()     #prefix -> [game, file stamp, estimated size, last check], least recently used first
+        self._active = {}       #game -> number of sessions playing it
+        self._retired = {}      #game replaced or dropped while sessions still play it -> estimated size
+        self._vocabularies = weakref.WeakValueDictionary()     #vocabulary key -> the AdvVocabulary worlds share
+
+    def getGame(self, prefix):     #returns the current game for a prefix, loading or reloading it if needed
+        entry = self._worlds.get(prefix)
+        now = time.monotonic()
+        if entry is not None:
+            self._worlds.move_to_end(prefix)
+            if now - entry[3] < self._check_interval:
+                return entry[0]
+            entry[3] = now
+            stamp = dataStamp(prefix)
+            if stamp == entry[1]:
+                return entry[0]
+            try:
+                game = self.loadWorld(prefix)
+            except (OSError, ValueError):
+                return entry[0]     #the stamp is kept, so the next check tries again
+            self.retire(entry)
+        else:
+            stamp = dataStamp(prefix)
+            game = self.loadWorld(prefix)
+        self._worlds[prefix] = [game, stamp, estimateSize(game), now]
+        self._worlds.move_to_end(prefix)
+        self.evict()
+        return game
+
+    def retire(self, entry):     #keeps counting a game that is no longer current until its sessions finish
+        game = entry[0]
+        if game in self._active:
+            self._retired[game] = entry[2]
+
+    def loadWorld(self, prefix):     #loads a world and shares its strings and vocabulary with the others
+        game = self._loader(prefix)
+        game.internStrings()
+        vocabulary = game.getVocabulary()
+        key = vocabulary.getKey()
+        shared = self._vocabularies.get(key)
+        if shared is None:
+            self._vocabularies[key] = vocabulary
+        else:
+            game.setVocabulary(shared)
+        return game
+
+    def openSession(self, prefix, output=None):     #returns (game, session) for a new player in a world
+        game = self.getGame(prefix)
+        session = game.newSession(output)
+        self._active[game] = self._active.get(game, 0) + 1
+        return game, session
+
+    def closeSession(self, game):     #records that a player opened with openSession has finished
+        n = self._active.get(game, 0) - 1
+        if n > 0:
+            self._active[game] = n
+        else:
+            self._active.pop(game, None)
+            self._retired.pop(game, None)
+
+    def getSessionCount(self, game):
+        return self._active.get(game, 0)
+
+    def evict(self):     #drops idle worlds, least recently used first, until the estimate fits the budget
+        if self._memory_budget is None:
+            return
+        total = self.getMemoryUsage()
+        for prefix in list(self._worlds)[:-1]:      #the world used last is always kept
+            if total <= self._memory_budget:
+                break
+            game, _, size, _ = self._worlds[prefix]
+            if game not in self._active:
+                del self._worlds[prefix]
+                total -= size
+
+    def unload(self, prefix):     #forgets a world; sessions still playing it keep it
+        entry = self._worlds.pop(prefix, None)
+        if entry is not None:
+            self.retire(entry)
+
+    def getLoadedWorlds(self):     #returns the prefixes of the loaded worlds, least recently used first
+        return list(self._worlds)
+
+    def getMemoryUsage(self):     #returns the estimated bytes held by the loaded worlds and the replaced ones still played
+        return sum(entry[2] for entry in self._worlds.values()) + sum(self._retired.values())
+
+def dataStamp(prefix):    #returns the modification times and sizes of a world's text files
+    stamp = []
+    for suffix in SOURCE_SUFFIXES:
+        try:
+            st = os.stat(prefix + suffix)
+            stamp.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            stamp.append(None)
+    return tuple(stamp)
+
+def estimateSize(game):    #returns the approximate number of bytes a game's world occupies
+    seen = set()
+    total = 0
+    stack = [game]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, "__slots__"):
+            stack.extend(getattr(obj, name) for name in obj.__slots__ if hasattr(obj, name))
+        elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+            stack.append(obj.__dict__)
+    return total
@@ -2,16 +2,18 @@
 # ------------------
 # This program plays the Adventure game.
 
-from AdvGame import AdvGame
+import sys
+
+import AdvCompile
 
 # Constants
 ADVENTURE_PREFIX = "Crowther"
 
 # Main program
-def Adventure():
-    game = AdvGame(ADVENTURE_PREFIX)
+def Adventure(prefix=ADVENTURE_PREFIX):
+    game = AdvCompile.loadCachedGame(prefix)     #parses the text files only when they changed
     game.run()
 
 # Startup code
 if __name__ == "__main__":
-    Adventure()
+    Adventure(sys.argv[1] if len(sys.argv) > 1 else ADVENTURE_PREFIX)
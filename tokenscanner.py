@@ -2,6 +2,9 @@
 This module implements a token scanner abstraction.
 """
 
+import codecs
+import re
+
 class ScannerError(Exception):
     pass
 
@@ -28,6 +31,10 @@ class TokenScanner:
     _LEADING_ZERO = 6
     _SCANNING_HEX = 7
     _FINAL_STATE = 8
+    _BLOCK_SIZE = 65536
+    _extraDigits = None
+    _HEX_DIGITS = frozenset("0123456789ABCDEFabcdef")
+    _ASCII = [chr(code) for code in range(128)]
 
 # Constructor
 
@@ -37,7 +44,9 @@ class TokenScanner:
         self._scanNumbersFlag = False
         self._scanStringsFlag = False
         self._operators = set()
+        self._operatorTrie = { }      # one level per character; the key "" marks a whole operator
         self._wordChars = ""
+        self.buildWordTable()
         self.setInput(input_str)
 
 # Sets the scanner input to the specified string or file.
@@ -95,15 +104,79 @@ class TokenScanner:
             if self.isWordCharacter(ch):
                 self.saveChar(ch)
                 return self.scanWord()
+            node = self._operatorTrie.get(ch)
+            if node is None:
+                return ch
             op = ch
-            while self.isOperatorPrefix(op):
+            longest = 1
+            while True:
                 ch = self.getChar()
                 if ch == "": break
                 op += ch
-            while len(op) > 1 and not self.isOperator(op):
-                self.saveChar(op[-1])
-                op = op[0:-1]
-            return op
+                node = node.get(ch)
+                if node is None: break
+                if "" in node:
+                    longest = len(op)
+            for ch in reversed(op[longest:]):
+                self.saveChar(ch)
+            return op[:longest]
+
+# Returns a generator that yields the remaining tokens of the input.  It
+# produces exactly the tokens nextToken would, but matches each one with a
+# compiled pattern and reads files, binary streams and sockets in blocks.
+
+    def tokens(self):
+        while len(self._savedTokens) != 0:
+            token = self._savedTokens.pop()
+            if token == "":     #saved by hasMoreTokens at the end of the input
+                return
+            yield token
+        buffer = "".join(reversed(self._savedCharacters)) + self._buffer[self._cp:]
+        source = self._file
+        self._savedCharacters = [ ]
+        self._buffer = ""
+        self._cp = 0
+        blocks = None if source is None else self.readBlocks(source)
+        eof = blocks is None
+        pattern, word, lookahead = self.compileLexer()
+        pos = 0
+        while True:
+            refill = False
+            for match in pattern.finditer(buffer, pos):
+                if not eof and (match.end() == len(buffer) or match.start() + lookahead > len(buffer)):
+                    refill = True       # the token may go on past the end of the buffer
+                    pos = match.start()
+                    break
+                kind = match.lastgroup
+                if kind == "eof":
+                    return
+                if kind == "comment":
+                    continue
+                if kind == "string" and match.group("close") is None and match.group("close2") is None:
+                    raise ScannerError("Unterminated string")
+                yield match.group(kind)
+                if kind == "number" and match.group("sign") is not None \
+                        and match.group("exponent") is None:
+                    pos = match.end()       # scanNumber pushes back an "e" after a bare exponent sign
+                    break
+            if refill:
+                buffer = buffer[pos:]
+                pos = 0
+                target = max(2 * len(buffer), lookahead)     # doubling keeps very long tokens linear
+                while not eof and len(buffer) < target:
+                    block = next(blocks, "")
+                    eof = block == ""
+                    buffer += block
+                continue
+            match = word.match(buffer, pos)
+            while not eof and match.end() == len(buffer):
+                block = next(blocks, "")
+                eof = block == ""
+                buffer = buffer[pos:] + block
+                pos = 0
+                match = word.match(buffer, pos)
+            pos = match.end()
+            yield "e" + match.group()
 
 # Saves one token to reread later.
 
@@ -147,11 +220,16 @@ class TokenScanner:
 
     def addWordCharacters(self, chars):
         self._wordChars += chars
+        self.buildWordTable()
 
 # Defines a new multicharacter operator.
 
     def addOperator(self, op):
         self._operators.add(op)
+        node = self._operatorTrie
+        for ch in op:
+            node = node.setdefault(ch, { })
+        node[""] = True
 
 # Returns the current position of the scanner in the buffer stream.
 
@@ -180,12 +258,16 @@ class TokenScanner:
 # Returns True if the character is valid in a word.
 
     def isWordCharacter(self, ch):
-        return ch.isalnum() or self._wordChars.find(ch) != -1
+        result = self._wordTable.get(ch)
+        if result is None:
+            result = ch.isalnum() or self._wordChars.find(ch) != -1
+            self._wordTable[ch] = result
+        return result
 
 # Returns True if the character ch is a hexadecimal digit.
 
     def isHexDigit(self, ch):
-        return len(ch) == 1 and "0123456789ABCDEFabcdef".find(ch) != -1
+        return ch in self._HEX_DIGITS
 
 # Returns the type of this token.
 
@@ -373,10 +455,75 @@ class TokenScanner:
         return op in self._operators
 
     def isOperatorPrefix(self, op):
-        for name in self._operators:
-            if name.startswith(op):
-                return True
-        return False
+        node = self._operatorTrie
+        for ch in op:
+            node = node.get(ch)
+            if node is None:
+                return False
+        return len(node) != 0
+
+# Fills the word-character table for ASCII; other characters are added the
+# first time they are seen, so the table never holds more than the input uses.
+
+    def buildWordTable(self):
+        self._wordTable = { }
+        for ch in self._ASCII:
+            self._wordTable[ch] = ch.isalnum() or self._wordChars.find(ch) != -1
+
+    def readBlocks(self, source):
+        read = getattr(source, "recv", None) or getattr(source, "read1", None) or source.read
+        decoder = None
+        while True:
+            data = read(self._BLOCK_SIZE)
+            if not data:
+                break
+            if not isinstance(data, str):
+                if decoder is None:
+                    decoder = codecs.getincrementaldecoder("utf-8")()
+                data = decoder.decode(data)
+                if data == "":
+                    continue
+            yield data
+        if decoder is not None:
+            data = decoder.decode(b"", True)
+            if data != "":
+                yield data
+
+# Builds the patterns used by tokens from the current settings.  Character
+# classes follow str.isspace, str.isalnum and str.isdigit exactly; \d only
+# covers decimal digits, so the other digits are found once and added.
+
+    def compileLexer(self):
+        if TokenScanner._extraDigits is None:
+            TokenScanner._extraDigits = "".join(ch for ch in map(chr, range(0x110000))
+                                                if ch.isdigit() and not ch.isdecimal())
+        digit = r"[\d" + re.escape(TokenScanner._extraDigits) + "]"
+        hexDigit = "[0-9A-Fa-f]"
+        extra = "".join(re.escape(ch) for ch in sorted(set(self._wordChars)))
+        wordChar = r"(?:[^\W_]|[" + extra + "])" if extra else r"[^\W_]"
+        parts = [ ]
+        if self._ignoreCommentsFlag:
+            parts.append(r"(?P<comment>//[^\n\r]*[\n\r]?|/\*(?:/|[\s\S]*?(?:\*/|\Z)))")
+        if self._scanStringsFlag:
+            escape = r"\\(?:[xu]" + hexDigit + "*|" + digit + r"+|[\s\S]?)"
+            parts.append(r'(?P<string>"(?:[^"\\]|' + escape + r')*(?P<close>")?'
+                         + r"|'(?:[^'\\]|" + escape + r")*(?P<close2>')?)")
+        if self._scanNumbersFlag:
+            exponent = "[eE](?:(?P<sign>[+-])(?P<exponent>" + digit + "+)?|" + digit + "+)?"
+            parts.append("(?P<number>(?:0" + digit + "*(?:(?P<hex>[xX])" + hexDigit + r"*|\." + digit + "*)?"
+                         + "|" + digit + r"+(?:\." + digit + "*)?)(?(hex)|(?:" + exponent + ")?))")
+        parts.append("(?P<word>" + wordChar + "+)")
+        operators = sorted((op for op in self._operators if len(op) > 1), key=len, reverse=True)
+        parts.append("(?P<operator>" + "".join(re.escape(op) + "|" for op in operators) + r"[\s\S])")
+        parts.append(r"(?P<eof>\Z)")
+        skip = ""
+        if self._ignoreWhitespaceFlag:
+            spaces = "".join(re.escape(op) for op in self._operators if len(op) == 1 and op.isspace())
+            skip = r"(?:(?![" + spaces + r"])\s)*" if spaces else r"\s*"
+        pattern = re.compile(skip + "(?:" + "|".join(parts) + ")")
+        word = re.compile(wordChar + "*")
+        lookahead = max([2] + [len(op) for op in self._operators]) + 1
+        return pattern, word, lookahead
 
 # Startup code
 